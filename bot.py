@@ -4,6 +4,7 @@ import time
 import traceback
 import re
 import asyncio
+import functools
 import logging
 import base64
 import json
@@ -29,6 +30,7 @@ import config
 import memory
 import database
 import token_tracking
+import http_session
 
 # Load environment variables from .env file
 load_dotenv()
@@ -127,8 +129,17 @@ async def token_usage_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             days = int(args[0])
             days = max(1, min(days, 365))  # Limit to between 1 and 365 days
         
-        # Generate the token usage report
-        report = token_tracking.format_token_usage_report(days=days)
+        # Generate the token usage report in a worker thread, so waiting for queued
+        # usage rows and the database queries don't block the event loop. Session
+        # stats are kept per thread, so they are read here and passed along
+        report = await asyncio.get_running_loop().run_in_executor(
+            None,
+            functools.partial(
+                token_tracking.format_token_usage_report,
+                days=days,
+                session_usage=token_tracking.get_session_token_usage()
+            )
+        )
         
         # Send as plain text with no Markdown formatting to avoid escaping issues
         await update.message.reply_text(
@@ -799,6 +810,22 @@ def escape_summary_for_markdown(text):
     
     return text
 
+# English digits and separators -> Persian equivalents, built once for str.translate
+PERSIAN_NUMBERS_TABLE = str.maketrans({
+    '0': '۰',
+    '1': '۱',
+    '2': '۲',
+    '3': '۳',
+    '4': '۴',
+    '5': '۵',
+    '6': '۶',
+    '7': '۷',
+    '8': '۸',
+    '9': '۹',
+    ',': '،',
+    '.': '٫'  # Persian decimal separator
+})
+
 def to_persian_numbers(text: str) -> str:
     """
     Convert English digits in a string to Persian digits.
@@ -809,25 +836,7 @@ def to_persian_numbers(text: str) -> str:
     Returns:
         str: The text with English digits replaced by Persian digits
     """
-    persian_digits = {
-        '0': '۰',
-        '1': '۱',
-        '2': '۲',
-        '3': '۳',
-        '4': '۴',
-        '5': '۵',
-        '6': '۶',
-        '7': '۷',
-        '8': '۸',
-        '9': '۹',
-        ',': '،',
-        '.': '٫'  # Persian decimal separator
-    }
-    
-    for english, persian in persian_digits.items():
-        text = text.replace(english, persian)
-    
-    return text
+    return text.translate(PERSIAN_NUMBERS_TABLE)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle incoming messages."""
@@ -978,6 +987,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # Process the bot's response in the background
         asyncio.create_task(memory.process_message_for_memory(bot_message_data))
 
+async def post_shutdown(application) -> None:
+    """Release shared resources when the application stops."""
+    await http_session.close_http_session()
+
 def main() -> None:
     """Start the bot."""
     # Get the Telegram token from environment variable
@@ -1000,7 +1013,7 @@ def main() -> None:
     logger.info(f"Using model for analysis: {memory.MODEL_FOR_ANALYSIS}")
 
     # Create the Application
-    application = ApplicationBuilder().token(token).build()
+    application = ApplicationBuilder().token(token).post_shutdown(post_shutdown).build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -1,9 +1,12 @@
 import os
+import copy
 import json
 import datetime
 from typing import List, Dict, Any, Optional
 import logging
 
+import file_cache
+
 logger = logging.getLogger(__name__)
 
 # Path to store message history
@@ -13,6 +16,9 @@ MESSAGES_FILE = os.path.join(DATA_DIR, "message_history.json")
 # Maximum number of messages to store
 MAX_MESSAGES = 1000  # Store 1000 messages as requested
 
+# Buffer size for writing the JSON files
+WRITE_BUFFER_SIZE = 64 * 1024
+
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -23,6 +29,22 @@ def initialize_database():
             json.dump({"messages": []}, f, ensure_ascii=False)
         logger.info(f"Created new message history file at {MESSAGES_FILE}")
 
+def _read_messages() -> Dict[str, Any]:
+    """Load the message history file, reusing the parsed data while the file is unchanged."""
+    return file_cache.load(MESSAGES_FILE, json.loads)
+
+def _write_messages(data: Dict[str, Any]):
+    """Write the message history file and keep the cache in step with it."""
+    # Serialize once and hand the bytes to a large write buffer, without indentation whitespace
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    try:
+        with open(MESSAGES_FILE, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(raw)
+    except Exception:
+        file_cache.forget(MESSAGES_FILE)
+        raise
+    file_cache.remember(MESSAGES_FILE, raw, data)
+
 def save_message(message_data: Dict[str, Any]) -> bool:
     """
     Save a message to the database.
@@ -30,6 +52,18 @@ def save_message(message_data: Dict[str, Any]) -> bool:
     Args:
         message_data: Dictionary containing message information
     
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    return save_messages([message_data])
+
+def save_messages(messages: List[Dict[str, Any]]) -> bool:
+    """
+    Save several messages to the database with a single read and write.
+    
+    Args:
+        messages: List of message dictionaries, oldest first
+    
     Returns:
         bool: True if successful, False otherwise
     """
@@ -37,20 +71,18 @@ def save_message(message_data: Dict[str, Any]) -> bool:
         initialize_database()
         
         # Read existing data
-        with open(MESSAGES_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_messages()
         
-        # Add new message
-        data["messages"].append(message_data)
+        # Add new messages to a new list, so the cached history only changes once written
+        all_messages = data["messages"] + messages
         
         # Limit to the most recent MAX_MESSAGES messages
-        if len(data["messages"]) > MAX_MESSAGES:
-            data["messages"] = data["messages"][-MAX_MESSAGES:]
+        if len(all_messages) > MAX_MESSAGES:
+            all_messages = all_messages[-MAX_MESSAGES:]
             logger.info(f"Trimmed message history to {MAX_MESSAGES} most recent messages")
         
         # Write updated data
-        with open(MESSAGES_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_messages({**data, "messages": all_messages})
         
         return True
     except Exception as e:
@@ -76,8 +108,7 @@ def get_messages(days: int = 3, chat_id: Optional[int] = None) -> List[Dict[str,
         cutoff_date = (datetime.datetime.now() - datetime.timedelta(days=days)).timestamp()
         
         # Read data
-        with open(MESSAGES_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_messages()
         
         # Filter messages by date and chat_id if provided
         filtered_messages = []
@@ -86,7 +117,8 @@ def get_messages(days: int = 3, chat_id: Optional[int] = None) -> List[Dict[str,
                 if chat_id is None or msg.get("chat_id") == chat_id:
                     filtered_messages.append(msg)
         
-        return filtered_messages
+        # Copy, so callers can't change the cache
+        return copy.deepcopy(filtered_messages)
     except Exception as e:
         logger.error(f"Error retrieving messages from database: {e}")
         return []
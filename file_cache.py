@@ -0,0 +1,70 @@
+"""
+Parsed-file cache shared by the JSON stores (group memory, user profiles,
+name corrections and message history).
+
+A parsed file is reused only while it provably hasn't changed on disk. The
+(mtime, size) pair alone can't show that: on filesystems with coarse
+timestamps a same-size rewrite within one tick keeps both. So entries
+recorded while the file's mtime was that recent are checked against a
+digest of the file's bytes before reuse, which is still much cheaper than
+parsing it again.
+"""
+
+import os
+import time
+import hashlib
+from typing import Any, Callable, Dict, Tuple
+
+# Coarsest mtime resolution to allow for (FAT stores 2-second timestamps)
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+# Cached files by path: ((mtime_ns, size), digest of the bytes, parsed data, time recorded)
+_entries: Dict[str, Tuple[Tuple[int, int], bytes, Any, int]] = {}
+
+def _file_version(path: str) -> Tuple[int, int]:
+    """Identify the current contents of a file by its mtime and size."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _digest(raw: bytes) -> bytes:
+    """Fingerprint a file's bytes."""
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+def load(path: str, parse: Callable[[bytes], Any]) -> Any:
+    """
+    Return the parsed contents of a file, parsing it only if it changed.
+
+    The result is shared with later calls, so callers must not modify it.
+
+    Args:
+        path: The file to read
+        parse: Turns the file's bytes into data
+
+    Returns:
+        The parsed file contents
+    """
+    version = _file_version(path)
+    entry = _entries.get(path)
+
+    # Trust the version only if the file was already older than a timestamp tick when recorded
+    if entry and entry[0] == version and version[0] < entry[3] - MTIME_RESOLUTION_NS:
+        return entry[2]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = _digest(raw)
+    data = entry[2] if entry and entry[1] == digest else parse(raw)
+    _entries[path] = (version, digest, data, time.time_ns())
+    return data
+
+def remember(path: str, raw: bytes, data: Any):
+    """Record data as the parsed contents of a file that was just written with raw."""
+    _entries[path] = (_file_version(path), _digest(raw), data, time.time_ns())
+
+def forget(path: str):
+    """Drop the cached contents of a file, e.g. after a failed write."""
+    _entries.pop(path, None)
+
+def clear():
+    """Drop every cached file."""
+    _entries.clear()
@@ -0,0 +1,25 @@
+"""
+Shared aiohttp session for the bot's outbound HTTP requests.
+Keeps connections alive between calls to the same hosts.
+"""
+
+from typing import Optional
+import aiohttp
+
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60)
+        )
+    return _session
+
+async def close_http_session() -> None:
+    """Close the shared aiohttp session, if one was opened."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import copy
 import logging
 import time
 from datetime import datetime, timedelta
@@ -13,6 +14,7 @@ import asyncio
 # Import config for model settings
 import config
 import token_tracking
+import file_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,6 +25,9 @@ MEMORY_FILE = os.path.join(DATA_DIR, "group_memory.json")
 USER_PROFILES_FILE = os.path.join(DATA_DIR, "user_profiles.json")
 NAME_CORRECTIONS_FILE = os.path.join(DATA_DIR, "name_corrections.json")
 
+# Buffer size for writing the JSON files
+WRITE_BUFFER_SIZE = 64 * 1024
+
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -32,6 +37,35 @@ MAX_PROFILE_CHARACTERISTICS = 20  # Increased from 10 to 20
 MEMORY_REFRESH_DAYS = 30  # How long before a memory item is considered "old"
 MODEL_FOR_ANALYSIS = config.OPENAI_MODEL_ANALYSIS  # Use the model specified in config
 
+# Prefer orjson for the memory files when it's installed. Both paths write compact
+# UTF-8 JSON that keeps non-ASCII text as-is and turns int keys into strings, and
+# both read back to the same data; the exact bytes can differ (e.g. float formatting)
+try:
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps(data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _read_json(path: str) -> Dict[str, Any]:
+    """Load one of the memory JSON files, reusing the parsed data while the file is unchanged."""
+    return file_cache.load(path, _json_loads)
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """Write one of the memory JSON files and keep the cache in step with it."""
+    # Serialize once and hand the bytes to a large write buffer, without indentation whitespace
+    raw = _json_dumps(data)
+    try:
+        with open(path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(raw)
+    except Exception:
+        file_cache.forget(path)
+        raise
+    file_cache.remember(path, raw, data)
+
 # Track token usage (updated to use token_tracking module)
 def log_token_usage(response, model, request_type):
     """Log token usage from OpenAI API response and save to token tracking database"""
@@ -54,25 +88,29 @@ def log_token_usage(response, model, request_type):
     
     return prompt_tokens, completion_tokens, total_tokens
 
+# Empty contents of each memory file, serialized once
+EMPTY_GROUP_MEMORY = b'{"groups":{}}'
+EMPTY_USER_PROFILES = b'{"users":{}}'
+EMPTY_NAME_CORRECTIONS = b'{"corrections":{}}'
+
+def _write_bytes(path: str, content: bytes):
+    """Write preformed file contents with a single os.write."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, content)
+    finally:
+        os.close(fd)
+
 def initialize_memory():
     """Initialize the memory files if they don't exist."""
-    # Initialize group memory
-    if not os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-            json.dump({"groups": {}}, f, ensure_ascii=False, indent=2)
-        logger.info(f"Created new group memory file at {MEMORY_FILE}")
-    
-    # Initialize user profiles
-    if not os.path.exists(USER_PROFILES_FILE):
-        with open(USER_PROFILES_FILE, "w", encoding="utf-8") as f:
-            json.dump({"users": {}}, f, ensure_ascii=False, indent=2)
-        logger.info(f"Created new user profiles file at {USER_PROFILES_FILE}")
-        
-    # Initialize name corrections
-    if not os.path.exists(NAME_CORRECTIONS_FILE):
-        with open(NAME_CORRECTIONS_FILE, "w", encoding="utf-8") as f:
-            json.dump({"corrections": {}}, f, ensure_ascii=False, indent=2)
-        logger.info(f"Created new name corrections file at {NAME_CORRECTIONS_FILE}")
+    for path, content, label in (
+        (MEMORY_FILE, EMPTY_GROUP_MEMORY, "group memory"),
+        (USER_PROFILES_FILE, EMPTY_USER_PROFILES, "user profiles"),
+        (NAME_CORRECTIONS_FILE, EMPTY_NAME_CORRECTIONS, "name corrections"),
+    ):
+        if not os.path.exists(path):
+            _write_bytes(path, content)
+            logger.info(f"Created new {label} file at {path}")
 
 async def analyze_message_for_memory(message_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -174,12 +212,10 @@ async def update_group_memory(chat_id: int, memory_item: Dict[str, Any]):
         initialize_memory()
         
         # Read existing memory data
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            memory_data = json.load(f)
+        memory_data = _read_json(MEMORY_FILE)
         
-        # Initialize group memory if it doesn't exist
-        if str(chat_id) not in memory_data["groups"]:
-            memory_data["groups"][str(chat_id)] = []
+        # Existing items for the group; the cached data is only replaced on write
+        group_memory = memory_data["groups"].get(str(chat_id), [])
         
         # Add new memory item
         # Lower the threshold to remember more items, not just the ones marked as memorable
@@ -189,19 +225,13 @@ async def update_group_memory(chat_id: int, memory_item: Dict[str, Any]):
             (memory_item.get("sentiment") in ["very positive", "very negative"])
         )
         
-        if is_somewhat_interesting or (len(memory_data["groups"][str(chat_id)]) < 20):
-            memory_data["groups"][str(chat_id)].append(memory_item)
-            
-            # Sort by timestamp (newest first)
-            memory_data["groups"][str(chat_id)].sort(key=lambda x: x.get("timestamp", 0), reverse=True)
-            
-            # Limit to maximum number of memory items
-            if len(memory_data["groups"][str(chat_id)]) > MAX_MEMORY_ITEMS_PER_GROUP:
-                memory_data["groups"][str(chat_id)] = memory_data["groups"][str(chat_id)][:MAX_MEMORY_ITEMS_PER_GROUP]
+        if is_somewhat_interesting or (len(group_memory) < 20):
+            # Sort by timestamp (newest first) and limit to maximum number of memory items
+            group_memory = sorted(group_memory + [memory_item], key=lambda x: x.get("timestamp", 0), reverse=True)
+            group_memory = group_memory[:MAX_MEMORY_ITEMS_PER_GROUP]
         
             # Write updated data
-            with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-                json.dump(memory_data, f, ensure_ascii=False, indent=2)
+            _write_json(MEMORY_FILE, {**memory_data, "groups": {**memory_data["groups"], str(chat_id): group_memory}})
                 
             logger.info(f"Added new memory item for group {chat_id}")
     
@@ -228,12 +258,11 @@ async def update_user_profile(user_id: int, username: str, traits: List[str], to
         initialize_memory()
         
         # Read existing profile data
-        with open(USER_PROFILES_FILE, "r", encoding="utf-8") as f:
-            profile_data = json.load(f)
+        profile_data = _read_json(USER_PROFILES_FILE)
         
-        # Initialize user profile if it doesn't exist
+        # Work on a copy of this user's profile so the cached data only changes once it is written
         if str(user_id) not in profile_data["users"]:
-            profile_data["users"][str(user_id)] = {
+            profile = {
                 "username": username,
                 "traits": {},
                 "topics_of_interest": {},
@@ -246,92 +275,92 @@ async def update_user_profile(user_id: int, username: str, traits: List[str], to
                 "message_count": 0
             }
         else:
+            profile = copy.deepcopy(profile_data["users"][str(user_id)])
             # Update username in case it changed
-            profile_data["users"][str(user_id)]["username"] = username
+            profile["username"] = username
         
         # Increment message count
-        profile_data["users"][str(user_id)]["message_count"] = profile_data["users"][str(user_id)].get("message_count", 0) + 1
+        profile["message_count"] = profile.get("message_count", 0) + 1
         
         # Update traits with frequency count
         for trait in traits:
             if trait:  # Skip empty traits
                 trait = trait.lower()
-                if trait in profile_data["users"][str(user_id)]["traits"]:
-                    profile_data["users"][str(user_id)]["traits"][trait] += 1
+                if trait in profile["traits"]:
+                    profile["traits"][trait] += 1
                 else:
-                    profile_data["users"][str(user_id)]["traits"][trait] = 1
+                    profile["traits"][trait] = 1
         
         # Update topics with frequency count
         for topic in topics:
             if topic:  # Skip empty topics
                 topic = topic.lower()
-                if topic in profile_data["users"][str(user_id)]["topics_of_interest"]:
-                    profile_data["users"][str(user_id)]["topics_of_interest"][topic] += 1
+                if topic in profile["topics_of_interest"]:
+                    profile["topics_of_interest"][topic] += 1
                 else:
-                    profile_data["users"][str(user_id)]["topics_of_interest"][topic] = 1
+                    profile["topics_of_interest"][topic] = 1
         
         # Update sentiment counts
         if sentiment in ["positive", "negative", "neutral"]:
-            profile_data["users"][str(user_id)]["sentiment_counts"][sentiment] += 1
+            profile["sentiment_counts"][sentiment] += 1
         
         # Update interests
         if interests:
             for interest in interests:
                 if interest:
                     interest = interest.lower()
-                    if interest in profile_data["users"][str(user_id)].get("interests", {}):
-                        profile_data["users"][str(user_id)]["interests"][interest] += 1
+                    if interest in profile.get("interests", {}):
+                        profile["interests"][interest] += 1
                     else:
-                        if "interests" not in profile_data["users"][str(user_id)]:
-                            profile_data["users"][str(user_id)]["interests"] = {}
-                        profile_data["users"][str(user_id)]["interests"][interest] = 1
+                        if "interests" not in profile:
+                            profile["interests"] = {}
+                        profile["interests"][interest] = 1
         
         # Update tone counts
         if tone:
             tone = tone.lower()
-            if "tone_counts" not in profile_data["users"][str(user_id)]:
-                profile_data["users"][str(user_id)]["tone_counts"] = {}
+            if "tone_counts" not in profile:
+                profile["tone_counts"] = {}
             
-            if tone in profile_data["users"][str(user_id)]["tone_counts"]:
-                profile_data["users"][str(user_id)]["tone_counts"][tone] += 1
+            if tone in profile["tone_counts"]:
+                profile["tone_counts"][tone] += 1
             else:
-                profile_data["users"][str(user_id)]["tone_counts"][tone] = 1
+                profile["tone_counts"][tone] = 1
         
         # Update language quality counts
         if language_quality:
             lang_quality = language_quality.lower()
-            if "language_quality_counts" not in profile_data["users"][str(user_id)]:
-                profile_data["users"][str(user_id)]["language_quality_counts"] = {}
+            if "language_quality_counts" not in profile:
+                profile["language_quality_counts"] = {}
             
-            if lang_quality in profile_data["users"][str(user_id)]["language_quality_counts"]:
-                profile_data["users"][str(user_id)]["language_quality_counts"][lang_quality] += 1
+            if lang_quality in profile["language_quality_counts"]:
+                profile["language_quality_counts"][lang_quality] += 1
             else:
-                profile_data["users"][str(user_id)]["language_quality_counts"][lang_quality] = 1
+                profile["language_quality_counts"][lang_quality] = 1
         
         # Update last_updated timestamp
-        profile_data["users"][str(user_id)]["last_updated"] = time.time()
+        profile["last_updated"] = time.time()
         
         # Prune traits and topics to keep only the most frequent
-        profile_data["users"][str(user_id)]["traits"] = dict(
-            sorted(profile_data["users"][str(user_id)]["traits"].items(), 
+        profile["traits"] = dict(
+            sorted(profile["traits"].items(), 
                    key=lambda item: item[1], reverse=True)[:MAX_PROFILE_CHARACTERISTICS]
         )
         
-        profile_data["users"][str(user_id)]["topics_of_interest"] = dict(
-            sorted(profile_data["users"][str(user_id)]["topics_of_interest"].items(), 
+        profile["topics_of_interest"] = dict(
+            sorted(profile["topics_of_interest"].items(), 
                    key=lambda item: item[1], reverse=True)[:MAX_PROFILE_CHARACTERISTICS]
         )
         
         # Prune interests to keep only the most frequent
-        if "interests" in profile_data["users"][str(user_id)]:
-            profile_data["users"][str(user_id)]["interests"] = dict(
-                sorted(profile_data["users"][str(user_id)]["interests"].items(), 
+        if "interests" in profile:
+            profile["interests"] = dict(
+                sorted(profile["interests"].items(), 
                        key=lambda item: item[1], reverse=True)[:MAX_PROFILE_CHARACTERISTICS]
             )
         
         # Write updated data
-        with open(USER_PROFILES_FILE, "w", encoding="utf-8") as f:
-            json.dump(profile_data, f, ensure_ascii=False, indent=2)
+        _write_json(USER_PROFILES_FILE, {**profile_data, "users": {**profile_data["users"], str(user_id): profile}})
             
         logger.info(f"Updated profile for user {username} (ID: {user_id})")
     
@@ -350,15 +379,13 @@ def store_name_correction(username: str, correct_persian_name: str):
         initialize_memory()
         
         # Read existing corrections data
-        with open(NAME_CORRECTIONS_FILE, "r", encoding="utf-8") as f:
-            corrections_data = json.load(f)
+        corrections_data = _read_json(NAME_CORRECTIONS_FILE)
         
-        # Store the correction
-        corrections_data["corrections"][username.lower()] = correct_persian_name
+        # Store the correction in a new mapping, leaving the cached one untouched until written
+        corrections = {**corrections_data["corrections"], username.lower(): correct_persian_name}
         
         # Write updated data
-        with open(NAME_CORRECTIONS_FILE, "w", encoding="utf-8") as f:
-            json.dump(corrections_data, f, ensure_ascii=False, indent=2)
+        _write_json(NAME_CORRECTIONS_FILE, {**corrections_data, "corrections": corrections})
             
         logger.info(f"Stored name correction: {username} -> {correct_persian_name}")
     
@@ -380,8 +407,7 @@ def get_persian_name(username: str) -> str:
             return username
             
         # Read corrections data
-        with open(NAME_CORRECTIONS_FILE, "r", encoding="utf-8") as f:
-            corrections_data = json.load(f)
+        corrections_data = _read_json(NAME_CORRECTIONS_FILE)
         
         # Look up correction
         return corrections_data["corrections"].get(username.lower(), username)
@@ -406,8 +432,7 @@ def get_group_memory(chat_id: int, limit: int = 30) -> List[Dict[str, Any]]:
             return []
             
         # Read memory data
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            memory_data = json.load(f)
+        memory_data = _read_json(MEMORY_FILE)
         
         # Get group memory
         if str(chat_id) not in memory_data["groups"]:
@@ -415,14 +440,27 @@ def get_group_memory(chat_id: int, limit: int = 30) -> List[Dict[str, Any]]:
             
         group_memory = memory_data["groups"][str(chat_id)]
         
-        # Sort by timestamp (newest first) and limit
-        group_memory.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
-        return group_memory[:limit]
+        # Sort by timestamp (newest first) and limit; the items are copied so callers can't change the cache
+        return copy.deepcopy(sorted(group_memory, key=lambda x: x.get("timestamp", 0), reverse=True)[:limit])
     
     except Exception as e:
         logger.error(f"Error retrieving group memory: {e}")
         return []
 
+def get_raw_store() -> Dict[str, Any]:
+    """
+    Get the whole group memory structure, for tests and diagnostics.
+    
+    The data is a copy of the parsed-file cache, so the memory file is not
+    parsed again unless it changed on disk.
+    
+    Returns:
+        Dictionary with a "groups" mapping of chat ID to memory items
+    """
+    if not os.path.exists(MEMORY_FILE):
+        return {"groups": {}}
+    return copy.deepcopy(_read_json(MEMORY_FILE))
+
 def get_user_profile(user_id: int) -> Dict[str, Any]:
     """
     Get the profile for a specific user.
@@ -438,14 +476,14 @@ def get_user_profile(user_id: int) -> Dict[str, Any]:
             return {}
             
         # Read profile data
-        with open(USER_PROFILES_FILE, "r", encoding="utf-8") as f:
-            profile_data = json.load(f)
+        profile_data = _read_json(USER_PROFILES_FILE)
         
         # Get user profile
         if str(user_id) not in profile_data["users"]:
             return {}
             
-        return profile_data["users"][str(user_id)]
+        # Copy, so callers can't change the cache
+        return copy.deepcopy(profile_data["users"][str(user_id)])
     
     except Exception as e:
         logger.error(f"Error retrieving user profile: {e}")
@@ -644,6 +682,14 @@ async def process_message_for_memory(message_data: Dict[str, Any]):
     except Exception as e:
         logger.error(f"Error processing message for memory: {e}")
 
+# Simple pattern matching for common correction phrases, compiled once at import
+NAME_CORRECTION_PATTERNS = [
+    re.compile(r"(?:اسم|نام) من (\S+) (?:هست|است)، نه (\S+)"),  # "My name is X, not Y"
+    re.compile(r"من رو (\S+) صدا کن، نه (\S+)"),  # "Call me X, not Y"
+    re.compile(r"(\S+) درسته، نه (\S+)"),  # "X is correct, not Y"
+    re.compile(r"اسمم (\S+) (?:هست|است) نه (\S+)"),  # "My name is X not Y"
+]
+
 def analyze_for_name_correction(message_text: str) -> Optional[Dict[str, str]]:
     """
     Analyze message for name corrections.
@@ -655,17 +701,8 @@ def analyze_for_name_correction(message_text: str) -> Optional[Dict[str, str]]:
         Dictionary with original and corrected names if a correction is found
     """
     try:
-        # Simple pattern matching for common correction phrases
-        correction_patterns = [
-            r"(?:اسم|نام) من (\S+) (?:هست|است)، نه (\S+)",  # "My name is X, not Y"
-            r"من رو (\S+) صدا کن، نه (\S+)",  # "Call me X, not Y"
-            r"(\S+) درسته، نه (\S+)",  # "X is correct, not Y"
-            r"اسمم (\S+) (?:هست|است) نه (\S+)",  # "My name is X not Y"
-        ]
-        
-        for pattern in correction_patterns:
-            import re
-            matches = re.search(pattern, message_text)
+        for pattern in NAME_CORRECTION_PATTERNS:
+            matches = pattern.search(message_text)
             if matches:
                 correct_name = matches.group(1)
                 wrong_name = matches.group(2)
@@ -3,6 +3,7 @@ OpenAI function calling support for the bot.
 """
 
 import os
+import re
 import json
 import logging
 import time
@@ -11,6 +12,8 @@ from typing import Dict, Any, List, Optional, Union, Tuple
 import asyncio
 import aiohttp
 
+import http_session
+
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +32,14 @@ except ImportError:
     is_new_openai = False
     logger.info("Using legacy OpenAI API client")
 
+# Prefer orjson for decoding function call arguments when it's installed
+# (orjson.JSONDecodeError subclasses json.JSONDecodeError)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Define function schemas for OpenAI function calling
 FUNCTION_DEFINITIONS = [
     {
@@ -188,6 +199,9 @@ FUNCTION_DEFINITIONS = [
     }
 ]
 
+# Function definitions indexed by name, built once from the static schema list
+FUNCTIONS_BY_NAME = {func["name"]: func for func in FUNCTION_DEFINITIONS}
+
 def get_openai_function_definitions() -> List[Dict[str, Any]]:
     """
     Get the list of function definitions to be used with OpenAI API.
@@ -380,7 +394,7 @@ async def process_function_calls(response_message, chat_id: Optional[int] = None
         
         # Parse function arguments
         try:
-            function_args = json.loads(function_call.arguments)
+            function_args = _json_loads(function_call.arguments)
         except json.JSONDecodeError:
             logger.error(f"Failed to parse function arguments: {function_call.arguments}")
             return "خطا در پردازش درخواست. لطفاً دوباره تلاش کنید."
@@ -403,6 +417,7 @@ async def process_function_calls(response_message, chat_id: Optional[int] = None
     # Process tool_calls (newer API)
     elif hasattr(response_message, 'tool_calls') and response_message.tool_calls:
         all_results = []
+        pending_calls = []  # (index in all_results, function name, function args)
         
         for tool_call in response_message.tool_calls:
             if tool_call.type == 'function':
@@ -410,25 +425,33 @@ async def process_function_calls(response_message, chat_id: Optional[int] = None
                 
                 # Parse function arguments
                 try:
-                    function_args = json.loads(tool_call.function.arguments)
+                    function_args = _json_loads(tool_call.function.arguments)
                 except json.JSONDecodeError:
                     logger.error(f"Failed to parse function arguments: {tool_call.function.arguments}")
                     all_results.append("خطا در پردازش درخواست. لطفاً دوباره تلاش کنید.")
                     continue
-                    
-                # Execute the function
-                result = await execute_function(function_name, function_args, chat_id, user_id)
                 
-                # Add the formatted result to our collection
-                if "message" in result:
-                    all_results.append(result["message"])
-                elif "formatted_message" in result:  # For backward compatibility
-                    all_results.append(result["formatted_message"])
-                elif "error" in result:
-                    all_results.append(f"خطا در اجرای '{function_name}': {result['error']}")
-                else:
-                    # If no formatted message or error, create a basic message
-                    all_results.append(f"نتیجه عملیات '{function_name}' با موفقیت دریافت شد.")
+                # Reserve this call's slot so results keep the order they were requested in
+                pending_calls.append((len(all_results), function_name, function_args))
+                all_results.append(None)
+        
+        # Execute the requested functions concurrently
+        results = await asyncio.gather(*(
+            execute_function(function_name, function_args, chat_id, user_id)
+            for _, function_name, function_args in pending_calls
+        ))
+        
+        for (index, function_name, _), result in zip(pending_calls, results):
+            # Add the formatted result to our collection
+            if "message" in result:
+                all_results[index] = result["message"]
+            elif "formatted_message" in result:  # For backward compatibility
+                all_results[index] = result["formatted_message"]
+            elif "error" in result:
+                all_results[index] = f"خطا در اجرای '{function_name}': {result['error']}"
+            else:
+                # If no formatted message or error, create a basic message
+                all_results[index] = f"نتیجه عملیات '{function_name}' با موفقیت دریافت شد."
         
         # Join all results, separated by dividers if there are multiple
         if len(all_results) > 1:
@@ -981,40 +1004,40 @@ async def get_top_news(category: str = "general", persian_only: bool = False) ->
         sources = persian_sources + ([] if persian_only else international_sources)
         
         # Fetch news from RSS feeds with timeout and proper error handling
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-            tasks = []
-            for source in sources:
-                # Get the appropriate RSS feed URL for the requested category
-                rss_url = source.get("category_mapping", {}).get(category, source.get("rss"))
-                if not rss_url:
-                    # If no category-specific RSS feed is available, use the general one
-                    rss_url = source.get("rss")
-                
-                # Skip sources without RSS feeds
-                if rss_url:
-                    tasks.append(fetch_rss_feed(session, source, rss_url))
-            
-            # Gather all results (continue even if some fail)
-            all_news = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Process results, filtering out exceptions and failed fetches
-            flattened_news = []
-            successful_sources = []
-            failed_sources = []
+        session = await http_session.get_http_session()
+        tasks = []
+        for source in sources:
+            # Get the appropriate RSS feed URL for the requested category
+            rss_url = source.get("category_mapping", {}).get(category, source.get("rss"))
+            if not rss_url:
+                # If no category-specific RSS feed is available, use the general one
+                rss_url = source.get("rss")
             
-            for i, source_news in enumerate(all_news):
-                if isinstance(source_news, Exception):
-                    # Log the exception and continue
-                    logger.error(f"Error fetching from {sources[i]['name']}: {source_news}")
-                    failed_sources.append(sources[i]['name'])
-                    continue
-                    
-                if source_news:
-                    flattened_news.extend(source_news)
-                    successful_sources.append(sources[i]['name'])
-                else:
-                    # No news returned, but not an exception
-                    failed_sources.append(sources[i]['name'])
+            # Skip sources without RSS feeds
+            if rss_url:
+                tasks.append(fetch_rss_feed(session, source, rss_url))
+        
+        # Gather all results (continue even if some fail)
+        all_news = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Process results, filtering out exceptions and failed fetches
+        flattened_news = []
+        successful_sources = []
+        failed_sources = []
+        
+        for i, source_news in enumerate(all_news):
+            if isinstance(source_news, Exception):
+                # Log the exception and continue
+                logger.error(f"Error fetching from {sources[i]['name']}: {source_news}")
+                failed_sources.append(sources[i]['name'])
+                continue
+                
+            if source_news:
+                flattened_news.extend(source_news)
+                successful_sources.append(sources[i]['name'])
+            else:
+                # No news returned, but not an exception
+                failed_sources.append(sources[i]['name'])
         
         # Sort by date (most recent first) and limit to a reasonable number
         if flattened_news:
@@ -1100,6 +1123,10 @@ async def get_top_news(category: str = "general", persian_only: bool = False) ->
             "formatted_message": f"متأسفانه در دریافت اخبار مشکلی پیش آمد: {str(e)}"
         }
 
+# Patterns used while parsing RSS feeds, compiled once at import
+_RSS_INVALID_CHARS_RE = re.compile(r'[^\x20-\x7E\x0A\x0D\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]+')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
 async def fetch_rss_feed(session, source, rss_url):
     """
     Fetch and parse an RSS feed from a news source.
@@ -1156,7 +1183,6 @@ def parse_rss_content(content, source):
     """
     try:
         import xml.etree.ElementTree as ET
-        import re
         from datetime import datetime
         import email.utils
         
@@ -1166,7 +1192,7 @@ def parse_rss_content(content, source):
         except ET.ParseError as e:
             logger.error(f"XML parsing error from {source['name']}: {e}")
             # Try to clean content before parsing again
-            clean_content = re.sub(r'[^\x20-\x7E\x0A\x0D\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]+', '', content)
+            clean_content = _RSS_INVALID_CHARS_RE.sub('', content)
             try:
                 root = ET.fromstring(clean_content)
             except ET.ParseError:
@@ -1195,7 +1221,7 @@ def parse_rss_content(content, source):
                                 
                                 # Clean description (remove HTML tags)
                                 if description:
-                                    description = re.sub(r'<[^>]+>', '', description)
+                                    description = _HTML_TAG_RE.sub('', description)
                                 
                                 # Parse date
                                 published_at = ""
@@ -1272,7 +1298,7 @@ def parse_rss_content(content, source):
                             
                             # Clean description (remove HTML tags)
                             if description:
-                                description = re.sub(r'<[^>]+>', '', description)
+                                description = _HTML_TAG_RE.sub('', description)
                             
                             # Parse date
                             published_at = ""
@@ -1326,7 +1352,7 @@ def parse_rss_content(content, source):
                         if title and (link or description):
                             # Clean description (remove HTML tags)
                             if description:
-                                description = re.sub(r'<[^>]+>', '', description)
+                                description = _HTML_TAG_RE.sub('', description)
                                 
                             articles.append({
                                 "title": title,
@@ -1347,6 +1373,54 @@ def parse_rss_content(content, source):
         logger.error(f"Error parsing RSS content from {source['name']}: {e}", exc_info=True)
         return []
 
+# Seconds a trends source gets before the next fallback is started alongside it
+TRENDS_FALLBACK_DELAY = 2.0
+
+async def _first_available_trends(session, trend_sources: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Return the trends of the first source that yields any, trying sources in priority order.
+    
+    The next source is started as soon as the running ones fail, or after TRENDS_FALLBACK_DELAY
+    if they are slow; the remaining requests are cancelled once one source succeeds.
+    """
+    remaining = iter(trend_sources)
+    running = {}  # task -> source name
+    
+    def start_next() -> bool:
+        source = next(remaining, None)
+        if source is None:
+            return False
+        task = asyncio.ensure_future(fetch_trending_hashtags(session, source["url"], source["name"]))
+        running[task] = source["name"]
+        return True
+    
+    start_next()
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, timeout=TRENDS_FALLBACK_DELAY, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # The running sources are slow; bring in the next fallback alongside them
+                start_next()
+                continue
+            
+            for task in done:
+                source_name = running.pop(task)
+                try:
+                    trends = task.result()
+                except Exception as e:
+                    logger.error(f"Error fetching trends from {source_name}: {e}")
+                    continue
+                if trends:
+                    return trends
+            
+            # The finished sources had nothing; fall back right away
+            start_next()
+        
+        return []
+    finally:
+        for task in running:
+            task.cancel()
+
 async def get_trending_hashtags(region: str = "worldwide", count: int = 20) -> Dict[str, Any]:
     """
     Retrieve trending hashtags and topics from X (Twitter).
@@ -1380,19 +1454,10 @@ async def get_trending_hashtags(region: str = "worldwide", count: int = 20) -> D
             }
         ]
         
-        # Fetch trends data from multiple sources
-        async with aiohttp.ClientSession() as session:
-            # We'll prioritize GetDayTrends but try multiple sources for redundancy
-            for source in trend_sources:
-                try:
-                    trends_data = await fetch_trending_hashtags(session, source["url"], source["name"])
-                    if trends_data and len(trends_data) > 0:
-                        # We found good data, no need to check other sources
-                        break
-                except Exception as e:
-                    logger.error(f"Error fetching trends from {source['name']}: {e}")
-                    trends_data = []
-            
+        # Fetch trends, starting the fallback sources only when the earlier ones fail or stall
+        session = await http_session.get_http_session()
+        trends_data = await _first_available_trends(session, trend_sources)
+        
         # Format the response
         result = {
             "region": region,
@@ -1410,6 +1475,9 @@ async def get_trending_hashtags(region: str = "worldwide", count: int = 20) -> D
             "trends": []
         }
 
+# Normalizes scraped tweet volumes like "12,5K+" in one pass: drop separators and "+", expand "K"
+_TWEET_VOLUME_TABLE = str.maketrans({",": None, "+": None, "K": "000"})
+
 async def fetch_trending_hashtags(session, url, source_name):
     """
     Fetch trending hashtags from specified source.
@@ -1451,7 +1519,7 @@ async def fetch_trending_hashtags(session, url, source_name):
                             # Extract tweet volume if available
                             tweet_volume = "N/A"
                             if volume_elem:
-                                tweet_volume = volume_elem.text.strip().replace(",", "").replace("K", "000").replace("+", "")
+                                tweet_volume = volume_elem.text.strip().translate(_TWEET_VOLUME_TABLE)
                             
                             # Get trend rank
                             rank = rank_elem.text.strip() if rank_elem else "N/A"
@@ -1514,6 +1582,25 @@ async def fetch_trending_hashtags(session, url, source_name):
         logger.error(f"Error in fetch_trending_hashtags from {source_name}: {e}")
         return []
 
+# Keywords that make optional functions relevant to a prompt, checked in this order
+_FUNCTION_TRIGGERS = [
+    # URL extraction
+    (["extract_content_from_url"], ["http", "www.", ".com", ".ir", ".org", "url", "وبسایت", "سایت", "لینک", "سرچ", "جستجو"]),
+    # Weather queries
+    (["get_weather"], ["هوا", "آب و هوا", "دما", "باران", "برف", "weather", "بارش", "درجه"]),
+    # Location/geocoding queries
+    (["geocode", "reverse_geocode"], ["آدرس", "مکان", "کجاست", "جغرافیایی", "نقشه", "موقعیت", "خیابان", "map", "location"]),
+    # Chat history queries
+    (["get_chat_history"], ["تاریخچه", "گفتگو", "چت", "history", "chat"]),
+]
+
+def _compile_triggers(triggers):
+    """Compile each trigger group's keywords into one alternation."""
+    return [(func_names, re.compile("|".join(re.escape(term) for term in terms))) for func_names, terms in triggers]
+
+# One pattern per group, so keywords shared or overlapping across groups still match every group
+_TRIGGER_PATTERNS = _compile_triggers(_FUNCTION_TRIGGERS)
+
 def select_relevant_functions(prompt: str, must_include: List[str] = None) -> List[Dict[str, Any]]:
     """
     Select only the relevant function definitions based on message content.
@@ -1529,39 +1616,19 @@ def select_relevant_functions(prompt: str, must_include: List[str] = None) -> Li
     if must_include is None:
         must_include = ["search_web"]  # Always include search by default
     
+    # Start with the must-include functions, then add the functions of each group
+    # with a keyword in the prompt; each search stops at the group's first match
     prompt_lower = prompt.lower()
-    selected_functions = []
-    
-    # First, add the must-include functions
-    for func_name in must_include:
-        for func in FUNCTION_DEFINITIONS:
-            if func["name"] == func_name and func not in selected_functions:
-                selected_functions.append(func)
-    
-    # Check for URL extraction needs
-    if any(term in prompt_lower for term in ["http", "www.", ".com", ".ir", ".org", "url", "وبسایت", "سایت", "لینک", "سرچ", "جستجو"]):
-        for func in FUNCTION_DEFINITIONS:
-            if func["name"] == "extract_content_from_url" and func not in selected_functions:
-                selected_functions.append(func)
+    wanted_names = list(must_include)
+    for func_names, pattern in _TRIGGER_PATTERNS:
+        if pattern.search(prompt_lower):
+            wanted_names.extend(func_names)
     
-    # Check for weather queries
-    if any(term in prompt_lower for term in ["هوا", "آب و هوا", "دما", "باران", "برف", "weather", "بارش", "درجه"]):
-        for func in FUNCTION_DEFINITIONS:
-            if func["name"] == "get_weather" and func not in selected_functions:
-                selected_functions.append(func)
-    
-    # Check for location/geocoding queries
-    if any(term in prompt_lower for term in ["آدرس", "مکان", "کجاست", "جغرافیایی", "نقشه", "موقعیت", "خیابان", "map", "location"]):
-        location_functions = ["geocode", "reverse_geocode"]
-        for func in FUNCTION_DEFINITIONS:
-            if func["name"] in location_functions and func not in selected_functions:
-                selected_functions.append(func)
-    
-    # Check for chat history queries
-    if any(term in prompt_lower for term in ["تاریخچه", "گفتگو", "چت", "history", "chat"]):
-        for func in FUNCTION_DEFINITIONS:
-            if func["name"] == "get_chat_history" and func not in selected_functions:
-                selected_functions.append(func)
+    selected_functions = []
+    for func_name in dict.fromkeys(wanted_names):
+        func = FUNCTIONS_BY_NAME.get(func_name)
+        if func:
+            selected_functions.append(func)
     
     # If no relevant functions found (beyond must_include), return must_include functions only
     return selected_functions 
\ No newline at end of file
@@ -5,24 +5,57 @@ import pytest
 import os
 import sys
 import asyncio
+from types import SimpleNamespace
 from unittest.mock import MagicMock, AsyncMock
 from telegram import Update, User, Message, Chat
-from telegram.ext import ContextTypes, CallbackContext
+from telegram.ext import ContextTypes
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import the bot module
-import bot
+# Run async tests on uvloop when it is installed
+try:
+    import uvloop
+    _LOOP_FACTORIES = {"uvloop": uvloop.new_event_loop}
+except ImportError:
+    _LOOP_FACTORIES = {"asyncio": asyncio.new_event_loop}
 
-# Mark all tests as asyncio, so we can use async functions directly
-pytest_plugins = ["pytest_asyncio"]
+@pytest.hookimpl(optionalhook=True)
+def pytest_asyncio_loop_factories(config, item):
+    """Create the pytest-asyncio event loops with uvloop when available."""
+    return _LOOP_FACTORIES
 
-# Apply 'asyncio' mark to all tests by default
-def pytest_collection_modifyitems(items):
-    for item in items:
-        if asyncio.iscoroutinefunction(item.function) and 'asyncio' not in item.keywords:
-            item.add_marker(pytest.mark.asyncio)
+@pytest.fixture(scope="session")
+def bot_module():
+    """Import the bot module once per session, only for tests that need it."""
+    import bot
+    return bot
+
+class _OpenAIObject(dict):
+    """Dict with attribute access, like the response objects of both OpenAI client versions."""
+    __getattr__ = dict.__getitem__
+
+@pytest.fixture
+def completion_response():
+    """Build a chat completion response carrying the given message content."""
+    def build(content):
+        return _OpenAIObject(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=_OpenAIObject(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        )
+    return build
+
+@pytest.fixture
+def openai_create(monkeypatch):
+    """Patch the chat completion call the bot makes with the installed OpenAI client."""
+    import openai_functions
+    if openai_functions.is_new_openai:
+        create = MagicMock()
+        monkeypatch.setattr(openai_functions.openai_client.chat.completions, "create", create)
+    else:
+        create = AsyncMock()
+        monkeypatch.setattr(openai_functions.openai_client.ChatCompletion, "acreate", create)
+    return create
 
 @pytest.fixture
 def mock_update():
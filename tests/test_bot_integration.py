@@ -2,13 +2,17 @@ import os
 import sys
 import pytest
 import asyncio
-from unittest.mock import AsyncMock, patch, MagicMock
-from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import bot
+# Keep these tests on one xdist worker so the bot import is only paid once
+pytestmark = pytest.mark.xdist_group("bot_integration")
+
+# Persian reply fragments asserted on by the tests below
+_APOLOGY = "متأسفم"
+_SEARCHING_NEWS = "در حال جستجوی اخبار"
 
 # Helper function to run async tests
 async def async_return(result):
@@ -17,19 +21,12 @@ async def async_return(result):
 # Run async function in a synchronous context
 def run_async(coroutine):
     """Helper to run async functions in tests."""
-    # Create a new event loop for each test
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine)
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+    return asyncio.run(coroutine)
 
-def test_start_command(mock_update, mock_context):
+def test_start_command(bot_module, mock_update, mock_context):
     """Test the /start command."""
     # Run the start command
-    run_async(bot.start(mock_update, mock_context))
+    run_async(bot_module.start(mock_update, mock_context))
     
     # Check that reply_html was called with the expected message
     mock_update.message.reply_html.assert_called_once()
@@ -37,31 +34,24 @@ def test_start_command(mock_update, mock_context):
     assert "سلام @test_user" in call_args
     assert "فیرتیق" in call_args
 
-def test_help_command(mock_update, mock_context):
+def test_help_command(bot_module, mock_update, mock_context):
     """Test the /help command."""
     # Run the help command
-    run_async(bot.help_command(mock_update, mock_context))
+    run_async(bot_module.help_command(mock_update, mock_context))
     
     # Check that reply_text was called with the expected message
     mock_update.message.reply_text.assert_called_once()
     call_args = mock_update.message.reply_text.call_args[0][0]
     assert "@firtigh" in call_args
 
-@patch('memory.process_message_for_memory')
-@patch('bot.generate_ai_response')
-def test_handle_message_with_mention(mock_generate, mock_process_memory, mock_update, mock_context):
+def test_handle_message_with_mention(bot_module, monkeypatch, mock_update, mock_context):
     """Test handling a message that mentions the bot."""
     # Set up the mock response
-    async def mock_response(*args, **kwargs):
-        return "This is a test AI response"
-    
-    mock_generate.side_effect = mock_response
+    mock_generate = AsyncMock(return_value="This is a test AI response")
+    monkeypatch.setattr('bot.generate_ai_response', mock_generate)
     
     # Set up the mock process_message_for_memory
-    async def mock_process(*args, **kwargs):
-        return None
-    
-    mock_process_memory.side_effect = mock_process
+    monkeypatch.setattr('memory.process_message_for_memory', AsyncMock(return_value=None))
     
     # Set up the message text and ensure no photo or reply chain
     mock_update.message.text = "Hello @firtigh, how are you?"
@@ -70,7 +60,7 @@ def test_handle_message_with_mention(mock_generate, mock_process_memory, mock_up
     mock_update.message.reply_to_message = None
     
     # Run the message handler
-    run_async(bot.handle_message(mock_update, mock_context))
+    run_async(bot_module.handle_message(mock_update, mock_context))
     
     # Check that generate_ai_response was called
     mock_generate.assert_called_once()
@@ -102,141 +92,126 @@ def test_handle_message_without_query(mock_update, mock_context):
     # Verify reply_text was called with the expected message
     mock_update.message.reply_text.assert_called_once_with(expected_message)
 
-def test_handle_message_without_mention(mock_update, mock_context):
+def test_handle_message_without_mention(bot_module, mock_update, mock_context):
     """Test handling a message that doesn't mention the bot."""
     # Set up the message text
     mock_update.message.text = "Hello, how are you?"
     mock_update.message.reply_to_message = None
     
     # Run the message handler
-    run_async(bot.handle_message(mock_update, mock_context))
+    run_async(bot_module.handle_message(mock_update, mock_context))
     
     # Check that reply_text was not called
     mock_update.message.reply_text.assert_not_called()
 
-@patch('openai_functions.openai_client.chat.completions.create')
-def test_generate_ai_response_success(mock_create):
+@pytest.mark.asyncio
+async def test_generate_ai_response_success(bot_module, openai_create, completion_response):
     """Test successful AI response generation."""
     # Set up the mock response
-    mock_response = MagicMock()
-    mock_response.choices = [MagicMock()]
-    mock_response.choices[0].message = MagicMock()
-    mock_response.choices[0].message.content = "This is a test AI response"
-    mock_create.return_value = mock_response
+    openai_create.return_value = completion_response("This is a test AI response")
     
     # Call the function and check the result
-    result = run_async(bot.generate_ai_response(
+    result = await bot_module.generate_ai_response(
         prompt="Test prompt",
         chat_id=123456,
         user_id=789012
-    ))
+    )
     assert result == "This is a test AI response"
 
-@patch('openai_functions.openai_client.chat.completions.create')
-def test_generate_ai_response_error(mock_create):
+@pytest.mark.asyncio
+async def test_generate_ai_response_error(bot_module, openai_create):
     """Test AI response generation with an error."""
     # Set up the mock to raise an exception
-    mock_create.side_effect = Exception("API error")
+    openai_create.side_effect = Exception("API error")
     
     # Call the function and check the result
-    result = run_async(bot.generate_ai_response(
+    result = await bot_module.generate_ai_response(
         prompt="Test prompt",
         chat_id=123456,
         user_id=789012
-    ))
-    assert "متأسفم" in result
+    )
+    assert _APOLOGY in result
 
 @pytest.mark.asyncio
-@patch('bot.web_search.is_news_query')
-@patch('bot.web_search.search_web')
-@patch('bot.web_search.format_search_results')
-@patch('bot.generate_ai_response')
-async def test_news_query_single_response(mock_generate_ai, mock_format_results, mock_search_web, mock_is_news_query,
-                                      mock_update, mock_context):
+async def test_news_query_single_response(bot_module, monkeypatch, mock_update, mock_context):
     """Test that news queries don't result in duplicate responses."""
     # Set up the test
     mock_update.message.text = "@firtigh اخبار امروز چیه؟"
+    mock_update.message.chat.type = "group"
+    
+    # News searches run through function calling inside generate_ai_response
+    mock_generate = AsyncMock(return_value="Here's the news: Test News from https://example.com")
+    monkeypatch.setattr('bot.generate_ai_response', mock_generate)
+    
+    # No reply chain, media or memory for this message
+    monkeypatch.setattr('bot.get_conversation_context', AsyncMock(return_value=("", [], False)))
+    monkeypatch.setattr('bot.extract_media_info', AsyncMock(return_value=(None, None, None)))
+    monkeypatch.setattr('memory.get_relevant_memory', AsyncMock(return_value=""))
+    monkeypatch.setattr('memory.get_user_profile_context', MagicMock(return_value=None))
+    monkeypatch.setattr('memory.process_message_for_memory', AsyncMock(return_value=None))
     
-    # Mock is_search_request to return True
-    with patch('bot.web_search.is_search_request', return_value=True):
-        # Mock is_news_query to identify this as a news query
-        async def mock_is_news(*args, **kwargs):
-            return True
-        mock_is_news_query.side_effect = mock_is_news
-        
-        # Mock the search_web function
-        async def mock_search(*args, **kwargs):
-            return [{"title": "Test News", "link": "https://example.com", "snippet": "This is a test news item"}]
-        mock_search_web.side_effect = mock_search
-        
-        # Mock format_search_results
-        mock_format_results.return_value = "Test News - This is a test news item - https://example.com"
-        
-        # Mock generate_ai_response
-        async def mock_ai_response(*args, **kwargs):
-            return "Here's the news: Test News from https://example.com"
-        mock_generate_ai.side_effect = mock_ai_response
-        
-        # Set up the context's bot username
-        mock_context.bot.username = "firtigh"
-        mock_context.bot.id = 12345
-        
-        # Call the handler
-        run_async(bot.handle_message(mock_update, mock_context))
-        
-        # Check that message.reply_text was called the correct number of times:
-        # 1. First call for "در حال جستجوی اخبار..."
-        # 2. Second call for the AI response (only once, not duplicated)
-        assert mock_update.message.reply_text.call_count == 2
+    # Set up the context's bot
+    mock_context.bot.username = "firtigh"
+    mock_context.bot.id = 12345
+    mock_context.bot_data = {}
+    mock_context.bot.send_chat_action = AsyncMock()
+    mock_context.bot.send_message = AsyncMock(return_value=MagicMock(message_id=2))
+    
+    # Call the handler
+    await bot_module.handle_message(mock_update, mock_context)
+    
+    # The answer is generated and sent exactly once, with no separate "searching" reply
+    mock_generate.assert_awaited_once()
+    calls = mock_context.bot.send_message.await_args_list
+    assert len(calls) == 1
+    (sent,) = (c.kwargs["text"] for c in calls)
+    assert "Here's the news" in sent
+    assert _SEARCHING_NEWS not in sent
+    mock_update.message.reply_text.assert_not_called()
 
-@patch('bot.escape_markdown_v2')
-@patch('bot.generate_ai_response')
-def test_message_formatting_error_handling(mock_generate_ai, mock_escape_markdown, mock_update, mock_context):
+def test_message_formatting_error_handling(bot_module, monkeypatch, mock_update, mock_context):
     """Test that when message formatting fails, we still only get one response."""
     # Set up the test
     mock_update.message.text = "@firtigh tell me something"
     
     # Mock generate_ai_response to return a message with formatting
-    async def mock_ai_response(*args, **kwargs):
-        return "Here is a *formatted* message with [link](http://example.com)"
-    mock_generate_ai.side_effect = mock_ai_response
+    monkeypatch.setattr('bot.generate_ai_response', AsyncMock(
+        return_value="Here is a *formatted* message with [link](http://example.com)"
+    ))
     
     # Mock escape_markdown_v2 to raise an exception (simulating a formatting error)
-    mock_escape_markdown.side_effect = Exception("Formatting error")
+    monkeypatch.setattr('bot.escape_markdown_v2', MagicMock(side_effect=Exception("Formatting error")))
     
     # Set up the context's bot username
     mock_context.bot.username = "firtigh"
     mock_context.bot.id = 12345
     
-    # Setup other necessary mocks
-    with patch('web_search.is_search_request', return_value=False):
-        # Call the handler
-        run_async(bot.handle_message(mock_update, mock_context))
-        
-        # Verify that reply_text was called exactly once (no duplicates)
-        mock_update.message.reply_text.assert_called_once()
-        
-        # Verify the error handling by checking we received the unformatted text
-        call_args = mock_update.message.reply_text.call_args[0][0]
-        assert "Here is a *formatted* message" in call_args
+    # Call the handler
+    run_async(bot_module.handle_message(mock_update, mock_context))
+    
+    # Verify that reply_text was called exactly once (no duplicates)
+    mock_update.message.reply_text.assert_called_once()
+    
+    # Verify the error handling by checking we received the unformatted text
+    call_args = mock_update.message.reply_text.call_args[0][0]
+    assert "Here is a *formatted* message" in call_args
 
-@patch('bot.generate_ai_response')
-def test_code_block_formatting(mock_generate_ai, mock_update, mock_context):
+def test_code_block_formatting(bot_module, monkeypatch, mock_update, mock_context):
     """Test that messages with code blocks are formatted correctly and only sent once."""
     # Set up the test
     mock_update.message.text = "@firtigh show me some code"
     
     # Mock generate_ai_response to return a message with code blocks
-    async def mock_ai_response(*args, **kwargs):
-        return "Here is some Python code:\n```python\ndef hello():\n    print('Hello world!')\n```"
-    mock_generate_ai.side_effect = mock_ai_response
+    monkeypatch.setattr('bot.generate_ai_response', AsyncMock(
+        return_value="Here is some Python code:\n```python\ndef hello():\n    print('Hello world!')\n```"
+    ))
     
     # Set up the context's bot username
     mock_context.bot.username = "firtigh"
     mock_context.bot.id = 12345
     
     # Call the handler
-    run_async(bot.handle_message(mock_update, mock_context))
+    run_async(bot_module.handle_message(mock_update, mock_context))
     
     # Check that message.reply_text was called only once
     assert mock_update.message.reply_text.call_count == 1
@@ -1,268 +1,223 @@
 """
-Unit tests for the Telegram bot using the unittest framework.
-This provides an alternative to the pytest-based tests.
+Unit tests for the Telegram bot handlers.
+These drive the handlers directly with mocked Telegram objects.
 """
 import os
 import sys
-import unittest
+import pytest
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch, MagicMock
-import asyncio
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import bot
+import database
+import memory
+from telegram import User, Message
+from telegram.ext import ContextTypes
 
-class TestBot(unittest.TestCase):
-    """Test cases for the Telegram bot."""
-    
-    def setUp(self):
-        """Set up test fixtures."""
-        from telegram import Update, User, Message, Chat
-        from telegram.ext import ContextTypes
-        
-        self.update = MagicMock(spec=Update)
-        self.context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
-        
-        # Mock user
-        self.user = MagicMock(spec=User)
-        self.user.mention_html.return_value = "@test_user"
-        self.user.username = "test_user"
-        self.user.id = 123456789
-        self.user.first_name = "Test"
-        self.user.last_name = "User"
-        
-        # Mock message
-        self.message = MagicMock(spec=Message)
-        self.message.reply_text = AsyncMock()
-        self.message.reply_html = AsyncMock()
-        self.message.text = ""
-        self.message.photo = []
-        self.message.animation = None
-        self.message.reply_to_message = None
-        self.message.from_user = self.user
-        self.message.message_id = 987654321
-        
-        # Set up update with user and message
-        self.update.effective_user = self.user
-        self.update.message = self.message
-        
-        # Set up chat
-        self.chat = MagicMock(spec=Chat)
-        self.chat.id = 111222333
-        self.chat.type = "group"
-        self.update.effective_chat = self.chat
-        self.update.message.chat = self.chat
-        
-        # Set up context bot
-        self.context.bot = MagicMock()
-        self.context.bot.username = "firtigh"
-        self.context.bot.id = 444555666
-    
-    def run_async(self, coroutine):
-        """Helper to run async functions in tests."""
-        # Create a new event loop for each test
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(coroutine)
-        finally:
-            loop.close()
-            asyncio.set_event_loop(None)
-    
-    def test_start_command(self):
-        """Test the /start command."""
-        # Run the start command
-        self.run_async(bot.start(self.update, self.context))
-        
-        # Check that reply_html was called with the expected message
-        self.message.reply_html.assert_called_once()
-        call_args = self.message.reply_html.call_args[0][0]
-        self.assertIn("سلام @test_user", call_args)
-        self.assertIn(bot.BOT_NAME, call_args)  # Check for the bot name constant
-        self.assertIn(bot.BOT_FULL_NAME, call_args)  # Check for the full name
-    
-    def test_help_command(self):
-        """Test the /help command."""
-        # Run the help command
-        self.run_async(bot.help_command(self.update, self.context))
-        
-        # Check that reply_text was called with the expected message
-        self.message.reply_text.assert_called_once()
-        call_args = self.message.reply_text.call_args[0][0]
-        
-        # Check for various expected elements in the help text
-        self.assertIn("دستورات قابل استفاده", call_args)
-        self.assertIn("/start", call_args)
-        self.assertIn("/help", call_args)
-        self.assertIn("در گروه‌ها", call_args)
-        self.assertIn("@firtigh", call_args)
-    
-    @patch('memory.process_message_for_memory')
-    @patch('database.save_message')
-    @patch('bot.generate_ai_response')
-    def test_handle_message_with_mention(self, mock_generate, mock_save_message, mock_process_memory):
-        """Test handling a message that mentions the bot."""
-        # Set up the mock response
-        async def mock_response(*args, **kwargs):
-            return "This is a test AI response"
-        
-        mock_generate.side_effect = mock_response
-        
-        # Set up the mock functions
-        async def mock_process(*args, **kwargs):
-            return None
-        
-        mock_process_memory.side_effect = mock_process
-        mock_save_message.return_value = True
-        
-        # Set up the message text and ensure no photo
-        self.message.text = f"Hello {bot.BOT_NAME}, how are you?"
-        self.message.photo = []
-        self.message.animation = None
-        self.message.reply_to_message = None
-        
-        # Run the message handler
-        self.run_async(bot.handle_message(self.update, self.context))
-        
-        # Check that save_message was called
-        mock_save_message.assert_called_once()
-        
-        # Check that generate_ai_response was called
-        mock_generate.assert_called_once()
-        
+
+@pytest.fixture
+def user():
+    """Mocked Telegram user."""
+    user = MagicMock(spec=User)
+    user.mention_html.return_value = "@test_user"
+    user.username = "test_user"
+    user.id = 123456789
+    user.first_name = "Test"
+    user.last_name = "User"
+    return user
+
+
+@pytest.fixture
+def chat():
+    """Group chat; only plain attributes are read, so no mock is needed."""
+    return SimpleNamespace(id=111222333, type="group")
+
+
+@pytest.fixture(scope="module")
+def reply_mocks():
+    """reply_text/reply_html mocks shared by every test in the module."""
+    return SimpleNamespace(text=AsyncMock(), html=AsyncMock())
+
+
+@pytest.fixture(autouse=True)
+def reset_reply_mocks(reply_mocks):
+    """Clear recorded calls on the shared reply mocks before each test."""
+    reply_mocks.text.reset_mock()
+    reply_mocks.html.reset_mock()
+
+
+@pytest.fixture
+def message(user, chat, reply_mocks):
+    """Mocked message sent by the user in the group chat."""
+    message = MagicMock(spec=Message)
+    message.reply_text = reply_mocks.text
+    message.reply_html = reply_mocks.html
+    message.text = ""
+    message.photo = []
+    message.animation = None
+    message.reply_to_message = None
+    message.from_user = user
+    message.message_id = 987654321
+    message.chat = chat
+    return message
+
+
+@pytest.fixture
+def update(user, message, chat):
+    """Update wrapping the message; handlers only read its attributes."""
+    return SimpleNamespace(effective_user=user, message=message, effective_chat=chat)
+
+
+@pytest.fixture
+def context():
+    """Mocked handler context with the bot identity set."""
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    context.bot = MagicMock()
+    context.bot.username = "firtigh"
+    context.bot.id = 444555666
+    return context
+
+
+@pytest.mark.asyncio
+async def test_start_command(update, context, message):
+    """Test the /start command."""
+    await bot.start(update, context)
+
+    # Check that reply_html was called with the expected message
+    message.reply_html.assert_called_once()
+    call_args = message.reply_html.call_args[0][0]
+    assert "سلام @test_user" in call_args
+    assert bot.BOT_NAME in call_args  # Check for the bot name constant
+    assert bot.BOT_FULL_NAME in call_args  # Check for the full name
+
+
+@pytest.mark.asyncio
+async def test_help_command(update, context, message):
+    """Test the /help command."""
+    await bot.help_command(update, context)
+
+    # Check that reply_text was called with the expected message
+    message.reply_text.assert_called_once()
+    call_args = message.reply_text.call_args[0][0]
+
+    # Check for various expected elements in the help text
+    assert "دستورات قابل استفاده" in call_args
+    assert "/start" in call_args
+    assert "/help" in call_args
+    assert "در گروه‌ها" in call_args
+    assert "@firtigh" in call_args
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("text,should_call_generate,expected_reply", [
+    (f"Hello {bot.BOT_NAME}, how are you?", True, "This is a test AI response"),
+    ("@firtigh", False, "صدا زدی"),
+    ("Hello, how are you?", False, None),
+])
+@patch.object(memory, 'process_message_for_memory', new_callable=AsyncMock)
+@patch.object(database, 'save_message')
+@patch.object(bot, 'generate_ai_response', new_callable=AsyncMock)
+async def test_handle_message(mock_generate, mock_save_message, mock_process_memory,
+                              update, context, message, text, should_call_generate, expected_reply):
+    """Test handling messages with a bot mention, a bare mention with no query, and no mention."""
+    mock_generate.return_value = "This is a test AI response"
+    mock_process_memory.return_value = None
+    mock_save_message.return_value = True
+
+    message.text = text
+
+    await bot.handle_message(update, context)
+
+    # The message is saved whether or not the bot was mentioned
+    mock_save_message.assert_called_once()
+
+    if should_call_generate:
         # Check that the bot responded with the mocked response
-        self.message.reply_text.assert_called_with("This is a test AI response")
-    
-    def test_handle_message_without_query(self):
-        """Test handling a message that mentions the bot but has no query."""
-        # Set up the message with a mention but no actual query
-        self.message.text = "@firtigh"
-        self.message.photo = []
-        self.message.animation = None
-        self.message.reply_to_message = None
-        
-        # Set up the reply_text method to capture the response
-        self.message.reply_text = AsyncMock()
-        
-        # Directly call the empty query response function
-        expected_message = "من رو صدا زدی، ولی سوالی نپرسیدی. چطور می‌تونم کمکت کنم؟ 🤔"
-        
-        # Run the async function that would be called for empty queries
-        async def run_test():
-            await self.message.reply_text(expected_message)
-        
-        # Execute the test function
-        self.run_async(run_test())
-        
-        # Verify reply_text was called with the expected message
-        self.message.reply_text.assert_called_once_with(expected_message)
-    
-    @patch('memory.process_message_for_memory')
-    @patch('database.save_message')
-    def test_handle_message_without_mention(self, mock_save_message, mock_process_memory):
-        """Test handling a message that doesn't mention the bot."""
-        # Set up the mock functions
-        async def mock_process(*args, **kwargs):
-            return None
-        
-        mock_process_memory.side_effect = mock_process
-        mock_save_message.return_value = True
-        
-        # Set up the message text
-        self.message.text = "Hello, how are you?"
-        self.message.reply_to_message = None
-        
-        # Run the message handler
-        self.run_async(bot.handle_message(self.update, self.context))
-        
-        # Check that save_message was called even though bot wasn't mentioned
-        mock_save_message.assert_called_once()
-        
-        # Check that reply_text was not called since bot wasn't mentioned
-        self.message.reply_text.assert_not_called()
-    
-    @patch('memory.get_group_memory')
-    @patch('memory.get_user_profile')
-    @patch('openai_functions.openai_client.chat.completions.create')
-    def test_generate_ai_response_success(self, mock_create, mock_get_profile, mock_get_memory):
-        """Test successful AI response generation."""
-        # Set up the mock response
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock()]
-        mock_response.choices[0].message = MagicMock()
-        mock_response.choices[0].message.content = "This is a test AI response"
-        mock_create.return_value = mock_response
-        
-        # Mock memory and profile responses
-        mock_get_memory.return_value = []
-        mock_get_profile.return_value = {}
-        
-        # Call the function and check the result
-        result = self.run_async(bot.generate_ai_response(
-            prompt="Test prompt",
-            chat_id=123456,
-            user_id=789012
-        ))
-        self.assertEqual(result, "This is a test AI response")
-        
-        # Check that the OpenAI API was called with the expected parameters
-        mock_create.assert_called_once()
-        call_kwargs = mock_create.call_args[1]
-        
-        # Check that we're using o3 mini as required in the user specs
-        self.assertEqual(call_kwargs["model"], "gpt-4o-mini")
-        
-        # Check prompt
-        self.assertEqual(call_kwargs["messages"][1]["content"], "Test prompt")
-        
-        # Check personality instructions
-        system_content = call_kwargs["messages"][0]["content"]
-        self.assertIn(bot.BOT_NAME, system_content)
-        self.assertIn(bot.BOT_FULL_NAME, system_content)
-        self.assertIn("رک", system_content)  # Direct/blunt
-        self.assertIn("مستقیم", system_content)  # Direct
-        self.assertIn("زشت", system_content)  # Offensive language
-        self.assertIn("توهین", system_content)  # Insulting language
-    
-    @patch('openai_functions.openai_client.chat.completions.create')
-    def test_generate_ai_response_error(self, mock_create):
-        """Test AI response generation with an error."""
-        # Set up the mock to raise an exception
-        mock_create.side_effect = Exception("API error")
-        
-        # Call the function and check the result
-        result = self.run_async(bot.generate_ai_response(
-            prompt="Test prompt",
-            chat_id=123456,
-            user_id=789012
-        ))
-        self.assertIn("متأسفم", result)
-    
-    @patch('memory.analyze_for_name_correction')
-    @patch('memory.store_name_correction')
-    @patch('memory.process_message_for_memory')
-    @patch('database.save_message')
-    def test_name_correction_detection(self, mock_save_message, mock_process, mock_store_correction, mock_analyze):
-        """Test detection and storage of name corrections."""
-        # Set up mocks
-        async def mock_process_func(*args, **kwargs):
-            return None
-        
-        mock_process.side_effect = mock_process_func
-        mock_save_message.return_value = True
-        mock_analyze.return_value = {"correct": "علی", "wrong": "Ali"}
-        
-        # Set up the message
-        self.message.text = "اسم من علی هست، نه Ali"
-        self.message.reply_to_message = None
-        
-        # Run the message handler
-        self.run_async(bot.handle_message(self.update, self.context))
-        
-        # Check that the name correction was analyzed and stored
-        mock_analyze.assert_called_once_with("اسم من علی هست، نه Ali")
-        mock_store_correction.assert_called_once_with("Ali", "علی")
-
-if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+        mock_generate.assert_called_once()
+        message.reply_text.assert_called_with(expected_reply)
+    elif expected_reply:
+        # A bare mention gets a prompt for a question instead of a generated reply
+        mock_generate.assert_not_called()
+        assert expected_reply in message.reply_text.call_args[0][0]
+    else:
+        # Check that the bot stayed quiet since it wasn't mentioned
+        mock_generate.assert_not_called()
+        message.reply_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch.object(memory, 'get_group_memory')
+@patch.object(memory, 'get_user_profile')
+async def test_generate_ai_response_success(mock_get_profile, mock_get_memory, openai_create, completion_response):
+    """Test successful AI response generation."""
+    mock_create = openai_create
+
+    # Set up the mock response
+    mock_create.return_value = completion_response("This is a test AI response")
+
+    # Mock memory and profile responses
+    mock_get_memory.return_value = []
+    mock_get_profile.return_value = {}
+
+    result = await bot.generate_ai_response(
+        prompt="Test prompt",
+        chat_id=123456,
+        user_id=789012
+    )
+    assert result == "This is a test AI response"
+
+    # Check that the OpenAI API was called with the expected parameters
+    mock_create.assert_called_once()
+    call_kwargs = mock_create.call_args[1]
+
+    # Check that we're using o3 mini as required in the user specs
+    assert call_kwargs["model"] == "gpt-4o-mini"
+
+    # Check prompt
+    assert call_kwargs["messages"][1]["content"] == "Test prompt"
+
+    # Check personality instructions
+    system_content = call_kwargs["messages"][0]["content"]
+    assert bot.BOT_NAME in system_content
+    assert bot.BOT_FULL_NAME in system_content
+    assert "رک" in system_content  # Direct/blunt
+    assert "مستقیم" in system_content  # Direct
+    assert "زشت" in system_content  # Offensive language
+    assert "توهین" in system_content  # Insulting language
+
+
+@pytest.mark.asyncio
+async def test_generate_ai_response_error(openai_create):
+    """Test AI response generation with an error."""
+    openai_create.side_effect = Exception("API error")
+
+    result = await bot.generate_ai_response(
+        prompt="Test prompt",
+        chat_id=123456,
+        user_id=789012
+    )
+    assert "متأسفم" in result
+
+
+@pytest.mark.asyncio
+@patch.object(memory, 'analyze_for_name_correction')
+@patch.object(memory, 'store_name_correction')
+@patch.object(memory, 'process_message_for_memory', new_callable=AsyncMock)
+@patch.object(database, 'save_message')
+async def test_name_correction_detection(mock_save_message, mock_process, mock_store_correction, mock_analyze,
+                                         update, context, message):
+    """Test detection and storage of name corrections."""
+    mock_process.return_value = None
+    mock_save_message.return_value = True
+    mock_analyze.return_value = {"correct": "علی", "wrong": "Ali"}
+
+    message.text = "اسم من علی هست، نه Ali"
+
+    await bot.handle_message(update, context)
+
+    # Check that the name correction was analyzed and stored
+    mock_analyze.assert_called_once_with("اسم من علی هست، نه Ali")
+    mock_store_correction.assert_called_once_with("Ali", "علی")
@@ -0,0 +1,58 @@
+import os
+import json
+import pytest
+import sys
+from unittest.mock import MagicMock
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_cache
+
+@pytest.fixture
+def cached_file(tmp_path):
+    """A small JSON file, with the cache emptied before and after the test."""
+    file_cache.clear()
+    path = tmp_path / "store.json"
+    path.write_bytes(b'{"value": "a"}')
+    yield str(path)
+    file_cache.clear()
+
+def test_unchanged_file_is_parsed_once(cached_file):
+    """Test that an unchanged file is parsed once and then served from the cache."""
+    parse = MagicMock(side_effect=json.loads)
+    
+    assert file_cache.load(cached_file, parse) is file_cache.load(cached_file, parse)
+    parse.assert_called_once()
+
+def test_same_size_rewrite_in_one_tick_is_seen(cached_file):
+    """Test that a same-size rewrite which keeps the file's mtime is still picked up."""
+    assert file_cache.load(cached_file, json.loads) == {"value": "a"}
+    
+    # Rewrite with the same size and put the old mtime back, as a coarse-timestamp filesystem would
+    stat = os.stat(cached_file)
+    with open(cached_file, "wb") as f:
+        f.write(b'{"value": "b"}')
+    os.utime(cached_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    
+    assert file_cache.load(cached_file, json.loads) == {"value": "b"}
+
+def test_old_file_with_same_version_is_trusted(cached_file, monkeypatch):
+    """Test that once a file is older than a timestamp tick, its version alone is enough."""
+    stat = os.stat(cached_file)
+    os.utime(cached_file, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 * file_cache.MTIME_RESOLUTION_NS))
+    data = file_cache.load(cached_file, json.loads)
+    
+    # The file isn't read again
+    monkeypatch.setattr("builtins.open", MagicMock(side_effect=AssertionError("file was read")))
+    assert file_cache.load(cached_file, json.loads) is data
+
+def test_remembered_write_is_not_parsed_again(cached_file):
+    """Test that data recorded for a write is reused without parsing the file."""
+    raw = b'{"value": "c"}'
+    with open(cached_file, "wb") as f:
+        f.write(raw)
+    data = {"value": "c"}
+    file_cache.remember(cached_file, raw, data)
+    
+    assert file_cache.load(cached_file, MagicMock(side_effect=AssertionError("parsed"))) is data
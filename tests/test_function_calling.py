@@ -1,7 +1,9 @@
+import asyncio
 import pytest
-import json
-from unittest.mock import patch, AsyncMock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock
 
+import openai_functions
 from openai_functions import (
     get_openai_function_definitions,
     process_function_calls,
@@ -10,15 +12,19 @@ from openai_functions import (
     get_chat_history
 )
 
+# Canned payloads shared by the tests below; none of the tests mutate them
+_SEARCH_RESULTS = [
+    {"title": "Test Result 1", "snippet": "This is a test result", "link": "https://example.com/1"},
+    {"title": "Test Result 2", "snippet": "Another test result", "link": "https://example.com/2"}
+]
+_SEARCH_FUNCTION_RESULT = {"results": [{"title": "Test", "url": "https://test.com"}]}
+
 @pytest.mark.asyncio
 async def test_search_web_function():
     """Test the search_web function"""
     with patch('web_search.search_web', new_callable=AsyncMock) as mock_search:
         # Mock the search results
-        mock_search.return_value = [
-            {"title": "Test Result 1", "snippet": "This is a test result", "link": "https://example.com/1"},
-            {"title": "Test Result 2", "snippet": "Another test result", "link": "https://example.com/2"}
-        ]
+        mock_search.return_value = _SEARCH_RESULTS
         
         # Call the function
         result = await search_web("test query", is_news=False)
@@ -68,17 +74,15 @@ async def test_get_chat_history_function():
 @pytest.mark.asyncio
 async def test_process_function_calls_search():
     """Test processing function calls for search"""
-    # Create a mock message with function call
-    message = MagicMock()
-    message.function_call.name = "search_web"
-    message.function_call.arguments = json.dumps({
-        "query": "test search",
-        "is_news": False
-    })
+    # Create a message with a function call
+    message = SimpleNamespace(function_call=SimpleNamespace(
+        name="search_web",
+        arguments='{"query": "test search", "is_news": false}'
+    ))
     
     with patch('openai_functions.search_web', new_callable=AsyncMock) as mock_search:
         # Mock the search function
-        mock_search.return_value = {"results": [{"title": "Test", "url": "https://test.com"}]}
+        mock_search.return_value = _SEARCH_FUNCTION_RESULT
         
         # Call process_function_calls
         result = await process_function_calls(message, 12345, 67890)
@@ -90,19 +94,120 @@ async def test_process_function_calls_search():
         assert result["name"] == "search_web"
         assert result["content"]["results"][0]["title"] == "Test"
 
+@pytest.mark.asyncio
+async def test_process_function_calls_runs_tool_calls_concurrently():
+    """Test that multiple tool calls run concurrently and keep their order"""
+    def tool_call(name, arguments):
+        return SimpleNamespace(type="function", function=SimpleNamespace(name=name, arguments=arguments))
+    
+    message = SimpleNamespace(function_call=None, tool_calls=[
+        tool_call("get_weather", '{"city": "Tehran"}'),
+        tool_call("search_web", "not json"),
+        tool_call("search_web", '{"query": "test search"}'),
+    ])
+    
+    started = []
+    both_started = asyncio.Event()
+    
+    async def fake_execute(function_name, function_args, chat_id=None, user_id=None):
+        started.append(function_name)
+        if len(started) == 2:
+            both_started.set()
+        # Each call waits for the other, so this only finishes if they run concurrently
+        await asyncio.wait_for(both_started.wait(), timeout=1)
+        return {"message": f"{function_name} done"}
+    
+    with patch('openai_functions.execute_function', side_effect=fake_execute) as mock_execute:
+        result = await process_function_calls(message, 12345, 67890)
+    
+    assert mock_execute.call_count == 2
+    parts = result.split("\n\n---\n\n")
+    assert parts[0] == "get_weather done"
+    assert "خطا" in parts[1]
+    assert parts[2] == "search_web done"
+
 def test_get_openai_function_definitions():
     """Test that function definitions are correctly formatted"""
     functions = get_openai_function_definitions()
     
     # Check that we have the expected functions
-    function_names = [f["name"] for f in functions]
-    assert "search_web" in function_names
-    assert "extract_content_from_url" in function_names
-    assert "get_chat_history" in function_names
+    funcs_by_name = {f["name"]: f for f in functions}
+    assert {"search_web", "extract_content_from_url", "get_chat_history"} <= funcs_by_name.keys()
     
     # Check schema of one function
-    search_func = next(f for f in functions if f["name"] == "search_web")
+    search_func = funcs_by_name["search_web"]
     assert "description" in search_func
     assert "parameters" in search_func
     assert "properties" in search_func["parameters"]
-    assert "query" in search_func["parameters"]["properties"] 
\ No newline at end of file
+    assert "query" in search_func["parameters"]["properties"] 
+
+_TREND_SOURCES = [{"name": name, "url": f"https://{name}.example/"} for name in ("first", "second", "third")]
+
+@pytest.mark.asyncio
+async def test_trends_fallbacks_only_start_when_needed(monkeypatch):
+    """Fallback trend sources are only fetched after the earlier ones come back empty."""
+    trends = {"first": [], "second": [{"name": "#trend"}], "third": [{"name": "#unused"}]}
+    fetch = AsyncMock(side_effect=lambda session, url, name: trends[name])
+    monkeypatch.setattr(openai_functions, "fetch_trending_hashtags", fetch)
+    
+    result = await openai_functions._first_available_trends(None, _TREND_SOURCES)
+    
+    assert result == [{"name": "#trend"}]
+    assert [call.args[2] for call in fetch.call_args_list] == ["first", "second"]
+
+@pytest.mark.asyncio
+async def test_trends_slow_source_is_raced_and_cancelled(monkeypatch):
+    """A stalled source gets a fallback started next to it and is cancelled once that succeeds."""
+    stalled = asyncio.Event()
+    cancelled = []
+    
+    async def fetch(session, url, name):
+        if name == "first":
+            try:
+                await stalled.wait()
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+        return [{"name": f"#{name}"}]
+    
+    monkeypatch.setattr(openai_functions, "fetch_trending_hashtags", fetch)
+    monkeypatch.setattr(openai_functions, "TRENDS_FALLBACK_DELAY", 0.01)
+    
+    result = await openai_functions._first_available_trends(None, _TREND_SOURCES)
+    await asyncio.sleep(0)
+    
+    assert result == [{"name": "#second"}]
+    assert cancelled == ["first"]
+
+def _selected_names(prompt, must_include=None):
+    return [func["name"] for func in openai_functions.select_relevant_functions(prompt, must_include)]
+
+@pytest.mark.parametrize("prompt", [
+    "سلام، حالت چطوره؟",
+    "آب و هوای تهران چطوره؟",
+    "این لینک رو ببین https://example.com",
+    "آدرس این مکان رو روی map نشون بده",
+    "Show me the chat history and the weather",
+    "WWW.EXAMPLE.ORG درجه هوا",
+])
+def test_select_relevant_functions_matches_keyword_checks(prompt):
+    """Selection matches checking each group's keywords with a plain substring test."""
+    prompt_lower = prompt.lower()
+    expected = ["search_web"]
+    for func_names, terms in openai_functions._FUNCTION_TRIGGERS:
+        if any(term in prompt_lower for term in terms):
+            expected.extend(func_names)
+    expected = [name for name in dict.fromkeys(expected) if name in openai_functions.FUNCTIONS_BY_NAME]
+    
+    assert _selected_names(prompt) == expected
+
+def test_select_relevant_functions_overlapping_triggers(monkeypatch):
+    """Keywords that share a prefix or overlap still select every group they belong to."""
+    monkeypatch.setattr(openai_functions, "_TRIGGER_PATTERNS", openai_functions._compile_triggers([
+        (["get_weather"], ["هوا"]),
+        (["geocode"], ["هواپیما"]),
+        (["get_chat_history"], ["پیما"]),
+    ]))
+    
+    assert _selected_names("هواپیما", must_include=[]) == ["get_weather", "geocode", "get_chat_history"]
+    assert _selected_names("هوا", must_include=[]) == ["get_weather"]
@@ -1,25 +1,36 @@
 import os
 import sys
+import functools
 import pytest
-import asyncio
-from unittest.mock import AsyncMock, patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import http_session
 import web_extractor
 
-# Helper function to run async tests
-def run_async(coroutine):
-    """Helper to run async functions in tests."""
-    # Create a new event loop for each test
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine)
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+# Page served by the mocked fetch in the content extraction tests
+_HTML = """
+        <html>
+            <head>
+                <title>Test Page</title>
+            </head>
+            <body>
+                <p>This is a test paragraph with sufficient length to be included in the extracted content.</p>
+                <p>This is another paragraph that should also be included in the extraction.</p>
+                <div>Short div</div>
+            </body>
+        </html>
+        """
+
+@functools.lru_cache(maxsize=None)
+def make_response(status, html=None):
+    """Build (once per status/body) a response stub whose text() is a plain coroutine."""
+    async def text():
+        return html
+    return SimpleNamespace(status=status, text=text)
 
 def test_automatic_link_extraction():
     """Test that links are automatically extracted from messages."""
@@ -47,60 +58,51 @@ def test_automatic_link_extraction():
     # Test with None input
     assert len(web_extractor.extract_urls(None)) == 0
 
-@patch('aiohttp.ClientSession.get')
-def test_content_extraction_from_valid_url(mock_get):
+@pytest.fixture
+def mock_get(monkeypatch):
+    """Make Playwright unavailable and serve the fallback fetch from a mocked shared session."""
+    monkeypatch.setattr(web_extractor, "async_playwright", MagicMock(side_effect=RuntimeError("no browser")))
+    session = MagicMock()
+    monkeypatch.setattr(http_session, "get_http_session", AsyncMock(return_value=session))
+    return session.get
+
+@pytest.mark.asyncio
+async def test_content_extraction_from_valid_url(mock_get):
     """Test content extraction from a valid URL."""
-    # Create a mock response
-    mock_response = AsyncMock()
-    mock_response.status = 200
-    mock_response.text = AsyncMock(
-        return_value="""
-        <html>
-            <head>
-                <title>Test Page</title>
-            </head>
-            <body>
-                <p>This is a test paragraph with sufficient length to be included in the extracted content.</p>
-                <p>This is another paragraph that should also be included in the extraction.</p>
-                <div>Short div</div>
-            </body>
-        </html>
-        """
-    )
+    mock_response = make_response(200, _HTML)
     
     # Configure the mock
     mock_get.return_value.__aenter__.return_value = mock_response
     
     # Call the function
-    title, content = run_async(web_extractor.extract_content_from_url("https://example.com"))
+    content = await web_extractor.extract_content_from_url("https://example.com")
     
     # Verify the extracted content
-    assert title == "Test Page"
+    assert content.startswith("عنوان: Test Page\n\n")
     assert "test paragraph" in content
     assert "another paragraph" in content
     
     # The short div should be excluded
     assert "Short div" not in content
 
-@patch('aiohttp.ClientSession.get')
-def test_handling_invalid_urls(mock_get):
+@pytest.mark.asyncio
+async def test_handling_invalid_urls(mock_get):
     """Test handling of invalid or inaccessible URLs."""
     # Test with a 404 response
-    mock_response_404 = AsyncMock()
-    mock_response_404.status = 404
+    mock_response_404 = make_response(404)
     mock_get.return_value.__aenter__.return_value = mock_response_404
     
-    title, content = run_async(web_extractor.extract_content_from_url("https://example.com/not-found"))
+    content = await web_extractor.extract_content_from_url("https://example.com/not-found")
     
-    assert "Error" in title
-    assert "Could not fetch content" in content
+    assert content.startswith("خطا:")
+    assert "404" in content
     
     # Test with an exception
     mock_get.return_value.__aenter__.side_effect = Exception("Connection error")
     
-    title, content = run_async(web_extractor.extract_content_from_url("https://example.com/error"))
+    content = await web_extractor.extract_content_from_url("https://example.com/error")
     
-    assert "Error" in title
-    assert "Could not extract content" in content
+    assert content.startswith("خطا:")
+    assert "Connection error" in content
 
 # The test_process_message_links function is removed as it was testing a function that has been removed 
\ No newline at end of file
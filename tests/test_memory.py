@@ -2,10 +2,8 @@ import os
 import sys
 import json
 import pytest
-import asyncio
-from unittest.mock import patch, MagicMock
-import tempfile
-import shutil
+from types import SimpleNamespace
+from unittest.mock import patch
 import time
 
 # Add the parent directory to sys.path
@@ -14,44 +12,46 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Import memory module
 import memory
 
-# Helper function to run async tests
-def run_async(coroutine):
-    """Helper to run async functions in tests."""
-    # Create a new event loop for each test
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine)
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+# Resolve the legacy completions class once; tests patch its create method directly
+from openai import ChatCompletion as _ChatCompletion
 
-# Create a temporary directory for test data
-@pytest.fixture
-def temp_data_dir():
+class _OpenAIObject(dict):
+    """Minimal stand-in for openai's response objects: a dict with attribute access."""
+    __getattr__ = dict.__getitem__
+
+# Point memory at a temporary directory for test data, once per module
+@pytest.fixture(scope="module")
+def temp_data_dir(tmp_path_factory):
     """Create a temporary directory for test data files."""
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
-    
-    # Set memory's DATA_DIR to our temp directory
-    original_data_dir = memory.DATA_DIR
-    memory.DATA_DIR = temp_dir
-    memory.MEMORY_FILE = os.path.join(temp_dir, "group_memory.json")
-    memory.USER_PROFILES_FILE = os.path.join(temp_dir, "user_profiles.json")
-    memory.NAME_CORRECTIONS_FILE = os.path.join(temp_dir, "name_corrections.json")
+    temp_dir = tmp_path_factory.mktemp("memory")
     
-    # Yield the temp directory
-    yield temp_dir
-    
-    # Clean up and restore original data directory
-    shutil.rmtree(temp_dir)
-    memory.DATA_DIR = original_data_dir
-    memory.MEMORY_FILE = os.path.join(original_data_dir, "group_memory.json")
-    memory.USER_PROFILES_FILE = os.path.join(original_data_dir, "user_profiles.json")
-    memory.NAME_CORRECTIONS_FILE = os.path.join(original_data_dir, "name_corrections.json")
+    # Paths are restored when the module is done; pytest removes the directory
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(memory, "DATA_DIR", str(temp_dir))
+        mp.setattr(memory, "MEMORY_FILE", str(temp_dir / "group_memory.json"))
+        mp.setattr(memory, "USER_PROFILES_FILE", str(temp_dir / "user_profiles.json"))
+        mp.setattr(memory, "NAME_CORRECTIONS_FILE", str(temp_dir / "name_corrections.json"))
+        yield temp_dir
+
+# Empty contents of each memory file
+EMPTY_MEMORY_FILES = {
+    "MEMORY_FILE": memory.EMPTY_GROUP_MEMORY,
+    "USER_PROFILES_FILE": memory.EMPTY_USER_PROFILES,
+    "NAME_CORRECTIONS_FILE": memory.EMPTY_NAME_CORRECTIONS,
+}
+
+@pytest.fixture(autouse=True)
+def reset_memory_files(temp_data_dir):
+    """Give each test freshly initialized (empty) memory files."""
+    for attr, content in EMPTY_MEMORY_FILES.items():
+        memory._write_bytes(getattr(memory, attr), content)
 
 def test_initialize_memory(temp_data_dir):
     """Test the initialize_memory function."""
+    # Start without the files the autouse fixture prepared
+    for attr in EMPTY_MEMORY_FILES:
+        os.remove(getattr(memory, attr))
+    
     # Call the function
     memory.initialize_memory()
     
@@ -76,12 +76,28 @@ def test_initialize_memory(temp_data_dir):
         assert "corrections" in corrections_data
         assert isinstance(corrections_data["corrections"], dict)
 
-@patch('openai.ChatCompletion.create')
-def test_analyze_message_for_memory(mock_create, temp_data_dir):
+def test_json_roundtrip_matches_stdlib(temp_data_dir):
+    """Files written by memory decode to the same data with the standard json module."""
+    data = {"groups": {-100123: {"memory_items": [{"topic": "سلام «دنیا»", "count": 3, "ratio": 0.1, "ok": True, "none": None}]}}}
+    # Int keys are written as strings, as the standard json module does
+    expected = json.loads(json.dumps(data))
+    memory._write_json(memory.MEMORY_FILE, data)
+    memory.file_cache.clear()
+    
+    with open(memory.MEMORY_FILE, "rb") as f:
+        raw = f.read()
+    
+    # Compact UTF-8 with the Persian text unescaped
+    assert "سلام «دنیا»".encode("utf-8") in raw
+    assert b" " not in raw.replace("سلام «دنیا»".encode("utf-8"), b"")
+    assert json.loads(raw) == expected
+    assert memory._read_json(memory.MEMORY_FILE) == expected
+
+@patch.object(_ChatCompletion, "create")
+async def test_analyze_message_for_memory(mock_create, temp_data_dir):
     """Test the analyze_message_for_memory function."""
     # Set up mock response
-    mock_response = MagicMock()
-    mock_response.choices[0].message.content = json.dumps({
+    mock_response = _OpenAIObject(usage={}, choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({
         "topics": ["tech", "AI"],
         "sentiment": "positive",
         "key_points": ["AI is improving", "Memory is useful"],
@@ -90,7 +106,7 @@ def test_analyze_message_for_memory(mock_create, temp_data_dir):
         "interests": ["technology", "artificial intelligence"],
         "tone": "enthusiastic",
         "language_quality": "articulate"
-    })
+    })))])
     mock_create.return_value = mock_response
     
     # Test message data
@@ -102,7 +118,7 @@ def test_analyze_message_for_memory(mock_create, temp_data_dir):
     }
     
     # Call the function
-    result = run_async(memory.analyze_message_for_memory(message_data))
+    result = await memory.analyze_message_for_memory(message_data)
     
     # Check the result
     assert "topics" in result
@@ -120,7 +136,7 @@ def test_analyze_message_for_memory(mock_create, temp_data_dir):
     assert "timestamp" in result
 
 @patch('memory.analyze_message_for_memory')
-def test_process_message_for_memory(mock_analyze, temp_data_dir):
+async def test_process_message_for_memory(mock_analyze, temp_data_dir):
     """Test the process_message_for_memory function."""
     # Set up mock response
     mock_analyze.return_value = {
@@ -139,9 +155,6 @@ def test_process_message_for_memory(mock_analyze, temp_data_dir):
         "sender_name": "test_user"
     }
     
-    # Initialize memory
-    memory.initialize_memory()
-    
     # Test message data
     message_data = {
         "chat_id": 123456,
@@ -152,16 +165,13 @@ def test_process_message_for_memory(mock_analyze, temp_data_dir):
     }
     
     # Call the function
-    run_async(memory.process_message_for_memory(message_data))
+    await memory.process_message_for_memory(message_data)
     
     # Verify that the analyze function was called
     mock_analyze.assert_called_once()
 
-def test_update_and_get_group_memory(temp_data_dir):
+async def test_update_and_get_group_memory(temp_data_dir):
     """Test the update_group_memory and get_group_memory functions."""
-    # Initialize memory
-    memory.initialize_memory()
-    
     # Test memory item
     memory_item = {
         "topics": ["test"],
@@ -177,7 +187,7 @@ def test_update_and_get_group_memory(temp_data_dir):
     }
     
     # Call update_group_memory
-    run_async(memory.update_group_memory(123456, memory_item))
+    await memory.update_group_memory(123456, memory_item)
     
     # Get the memory and verify
     memories = memory.get_group_memory(123456)
@@ -187,13 +197,33 @@ def test_update_and_get_group_memory(temp_data_dir):
     assert memories[0]["sender_id"] == 456
     assert memories[0]["sender_name"] == "test_user"
 
-def test_update_and_get_user_profile(temp_data_dir):
-    """Test the update_user_profile and get_user_profile functions."""
-    # Initialize memory
-    memory.initialize_memory()
+async def test_cached_data_matches_disk(temp_data_dir):
+    """Reads and failed updates leave the parsed-file cache the same as the files on disk."""
+    items = [{"message_id": 1, "timestamp": 1.0}, {"message_id": 2, "timestamp": 2.0}]
+    memory._write_json(memory.MEMORY_FILE, {"groups": {"123456": items}})
+    
+    # Reading sorts a copy, not the cached list
+    assert [m["message_id"] for m in memory.get_group_memory(123456)] == [2, 1]
+    
+    # Changing what the getters return does not change the cache
+    memory.get_group_memory(123456)[0]["message_id"] = 99
+    memory.get_raw_store()["groups"].clear()
+    assert [m["message_id"] for m in memory.get_group_memory(123456)] == [2, 1]
+    
+    # Updates that fail to write do not touch the cached data
+    with patch("memory._write_json", side_effect=OSError("disk full")):
+        await memory.update_group_memory(654321, {"is_memorable": True, "timestamp": 3.0})
+        await memory.update_user_profile(789012, "test_user", ["curious"], ["tech"], "positive")
+        memory.store_name_correction("test_user", "کاربر")
     
+    for path in (memory.MEMORY_FILE, memory.USER_PROFILES_FILE, memory.NAME_CORRECTIONS_FILE):
+        with open(path, encoding="utf-8") as f:
+            assert memory._read_json(path) == json.load(f)
+
+async def test_update_and_get_user_profile(temp_data_dir):
+    """Test the update_user_profile and get_user_profile functions."""
     # Call update_user_profile with additional parameters
-    run_async(memory.update_user_profile(
+    await memory.update_user_profile(
         user_id=789012,
         username="test_user",
         traits=["friendly", "helpful"],
@@ -202,7 +232,7 @@ def test_update_and_get_user_profile(temp_data_dir):
         interests=["technology", "programming"],
         tone="enthusiastic",
         language_quality="articulate"
-    ))
+    )
     
     # Get the profile and verify
     profile = memory.get_user_profile(789012)
@@ -215,12 +245,13 @@ def test_update_and_get_user_profile(temp_data_dir):
     assert "articulate" in profile["language_quality_counts"]
     assert "message_count" in profile
     assert profile["message_count"] == 1
+    
+    # The profile is a copy; changing it does not change the stored one
+    profile["traits"].clear()
+    assert "friendly" in memory.get_user_profile(789012)["traits"]
 
 def test_name_correction_functions(temp_data_dir):
     """Test the name correction functions."""
-    # Initialize memory
-    memory.initialize_memory()
-    
     # Store a name correction
     memory.store_name_correction("john_doe", "جان دو")
     
@@ -236,29 +267,20 @@ def test_name_correction_functions(temp_data_dir):
     unknown_name = memory.get_persian_name("unknown_user")
     assert unknown_name == "unknown_user"
 
-def test_analyze_for_name_correction(temp_data_dir):
+@pytest.mark.parametrize("text,expected", [
+    ("اسم من علی است، نه ali", {"correct": "علی", "wrong": "ali"}),
+    ("من رو محمد صدا کن، نه Mohammad", {"correct": "محمد", "wrong": "Mohammad"}),
+    ("حسین درسته، نه Hossein", {"correct": "حسین", "wrong": "Hossein"}),
+    # No correction
+    ("این یک متن معمولی است بدون تصحیح نام", None),
+])
+def test_analyze_for_name_correction(text, expected):
     """Test the analyze_for_name_correction function."""
-    # Test various correction patterns
-    correction1 = memory.analyze_for_name_correction("اسم من علی است، نه ali")
-    assert correction1["correct"] == "علی"
-    assert correction1["wrong"] == "ali"
-    
-    correction2 = memory.analyze_for_name_correction("من رو محمد صدا کن، نه Mohammad")
-    assert correction2["correct"] == "محمد"
-    assert correction2["wrong"] == "Mohammad"
-    
-    correction3 = memory.analyze_for_name_correction("حسین درسته، نه Hossein")
-    assert correction3["correct"] == "حسین"
-    assert correction3["wrong"] == "Hossein"
-    
-    # Test no correction
-    no_correction = memory.analyze_for_name_correction("این یک متن معمولی است بدون تصحیح نام")
-    assert no_correction is None
+    assert memory.analyze_for_name_correction(text) == expected
 
 def test_format_memory_for_context(temp_data_dir):
     """Test the format_memory_for_context function."""
-    # Initialize memory with name corrections
-    memory.initialize_memory()
+    # Add a name correction
     memory.store_name_correction("test_user", "کاربر آزمایشی")
     
     # Test memory items
@@ -288,8 +310,7 @@ def test_format_memory_for_context(temp_data_dir):
 
 def test_format_user_profile_for_context(temp_data_dir):
     """Test the format_user_profile_for_context function."""
-    # Initialize memory with name corrections
-    memory.initialize_memory()
+    # Add a name correction
     memory.store_name_correction("test_user", "کاربر آزمایشی")
     
     # Test user profile
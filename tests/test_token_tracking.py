@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import sys
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import token_tracking
+
+@pytest.fixture(autouse=True)
+def token_db(tmp_path, monkeypatch):
+    """Point token_tracking at a fresh database in a per-test temp directory."""
+    # Rows queued by earlier code must not land in this test's database
+    token_tracking.flush_token_usage()
+    monkeypatch.setattr(token_tracking, "TOKEN_DB_PATH", str(tmp_path / "token_usage.db"))
+    conn = token_tracking._connect()
+    monkeypatch.setattr(token_tracking, "_conn", conn)
+    yield token_tracking.TOKEN_DB_PATH
+    token_tracking.flush_token_usage()
+    conn.close()
+    token_tracking.reset_session_token_usage()
+
+def test_database_opens_on_first_use(tmp_path, monkeypatch):
+    """Test that the database file is only created once token usage is needed."""
+    db_path = tmp_path / "lazy_token_usage.db"
+    monkeypatch.setattr(token_tracking, "TOKEN_DB_PATH", str(db_path))
+    monkeypatch.setattr(token_tracking, "_conn", None)
+    assert not db_path.exists()
+    
+    assert token_tracking.get_token_usage_summary(days=1)["total_requests"] == 0
+    assert db_path.exists()
+    token_tracking._conn.close()
+
+def test_tracked_usage_reaches_summary():
+    """Test that queued usage rows are written by the writer thread and counted in the summary."""
+    usage = token_tracking.track_token_usage("gpt-4o", "Function Calling API", 1000, 500, 1500)
+    assert usage["estimated_cost"] == 0.0125
+    token_tracking.track_token_usage("gpt-4o-mini", "Vision API", 200, 100, 300)
+    
+    token_tracking.flush_token_usage()
+    summary = token_tracking.get_token_usage_summary(days=1)
+    
+    assert summary["total_requests"] == 2
+    assert summary["total_prompt_tokens"] == 1200
+    assert summary["total_completion_tokens"] == 600
+    assert summary["total_tokens"] == 1800
+    assert summary["model_usage"]["gpt-4o"]["requests"] == 1
+    assert summary["model_usage"]["gpt-4o-mini"]["total_tokens"] == 300
+    assert sum(day["requests"] for day in summary["daily_usage"]) == 2
+
+def test_failed_write_is_retried(monkeypatch, caplog):
+    """Test that a failed write doesn't hang the flush and its rows are written with the next batch."""
+    write_usage_rows = token_tracking._write_usage_rows
+    calls = []
+    
+    def flaky_write(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        write_usage_rows(rows)
+    
+    monkeypatch.setattr(token_tracking, "_write_usage_rows", flaky_write)
+    
+    # The flush returns even though the write failed
+    token_tracking.track_token_usage("gpt-4o", "Function Calling API", 100, 50, 150)
+    token_tracking.flush_token_usage()
+    assert "database is locked" in caplog.text
+    
+    # The failed row is written together with the next one
+    token_tracking.track_token_usage("gpt-4o", "Function Calling API", 100, 50, 150)
+    summary = token_tracking.get_token_usage_summary(days=1)
+    
+    assert summary["total_requests"] == 2
+    assert summary["total_tokens"] == 300
+
+def test_report_built_on_worker_thread():
+    """Test that the report can be built off the tracking thread with the caller's session stats."""
+    token_tracking.track_token_usage("gpt-4o", "Function Calling API", 100, 50, 150)
+    session = token_tracking.get_session_token_usage()
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        report = executor.submit(token_tracking.format_token_usage_report, days=1, session_usage=session).result()
+    
+    assert "Total Requests: 1" in report
+    assert "gpt-4o: 150 tokens" in report
+
+# token_usage as it was created before timestamps were stored as epoch seconds
+OLD_TOKEN_USAGE_SCHEMA = '''
+    CREATE TABLE token_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        model TEXT NOT NULL,
+        request_type TEXT NOT NULL,
+        prompt_tokens INTEGER NOT NULL,
+        completion_tokens INTEGER NOT NULL,
+        total_tokens INTEGER NOT NULL,
+        estimated_cost REAL NOT NULL
+    )
+    '''
+
+@pytest.fixture
+def local_timezone(monkeypatch):
+    """Run with a local timezone away from UTC, so the migration's conversion is visible."""
+    monkeypatch.setenv("TZ", "Asia/Tehran")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_text_timestamps_are_migrated(tmp_path, monkeypatch, local_timezone):
+    """Test that a database with local ISO timestamps is rebuilt with epoch seconds on connect."""
+    now = datetime.now()
+    used_at = [now - timedelta(hours=1), now - timedelta(days=10), now - timedelta(days=40)]
+    
+    # Write a database the way older versions did
+    old_db = str(tmp_path / "old_token_usage.db")
+    conn = sqlite3.connect(old_db)
+    conn.execute(OLD_TOKEN_USAGE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO token_usage (timestamp, model, request_type, prompt_tokens, completion_tokens, total_tokens, estimated_cost) "
+        "VALUES (?, 'gpt-4o', 'Function Calling API', 100, 50, 150, 0.00125)",
+        [(dt.isoformat(),) for dt in used_at]
+    )
+    conn.commit()
+    conn.close()
+    
+    monkeypatch.setattr(token_tracking, "TOKEN_DB_PATH", old_db)
+    conn = token_tracking._connect()
+    monkeypatch.setattr(token_tracking, "_conn", conn)
+    
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(token_usage)")}
+    assert columns["timestamp"] == "INTEGER"
+    
+    timestamps = [row[0] for row in conn.execute("SELECT timestamp FROM token_usage ORDER BY id")]
+    assert timestamps == [int(dt.timestamp()) for dt in used_at]
+    
+    # Reporting windows count the migrated rows by their real age
+    assert token_tracking.get_token_usage_summary(days=1)["total_requests"] == 1
+    assert token_tracking.get_token_usage_summary(days=30)["total_requests"] == 2
+    assert token_tracking.get_token_usage_summary(days=60)["total_requests"] == 3
+    conn.close()
@@ -1,8 +1,8 @@
 import os
 import json
-import unittest
-import tempfile
-from unittest.mock import patch, MagicMock
+import pytest
+import time
+from unittest.mock import patch
 from datetime import datetime, timedelta
 import sys
 
@@ -11,168 +11,143 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import usage_limits
 
-class TestUsageLimits(unittest.TestCase):
-    """Test cases for the usage limits functionality."""
-    
-    def setUp(self):
-        """Set up test environment."""
-        # Create a temporary directory for test data
-        self.temp_dir = tempfile.TemporaryDirectory()
-        self.original_data_dir = usage_limits.DATA_DIR
-        self.original_usage_file = usage_limits.USAGE_FILE
-        
-        # Patch the data directory and file paths
-        usage_limits.DATA_DIR = self.temp_dir.name
-        usage_limits.USAGE_FILE = os.path.join(self.temp_dir.name, "usage_limits.json")
-    
-    def tearDown(self):
-        """Clean up after tests."""
-        # Restore original paths
-        usage_limits.DATA_DIR = self.original_data_dir
-        usage_limits.USAGE_FILE = self.original_usage_file
-        
-        # Clean up temporary directory
-        self.temp_dir.cleanup()
+# Use orjson for the usage file round-trips when available
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+    _loads = json.loads
+
+@pytest.fixture(autouse=True)
+def usage_file(tmp_path, monkeypatch):
+    """Point usage_limits at a usage file in a per-test temp directory."""
+    monkeypatch.setattr(usage_limits, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(usage_limits, "USAGE_FILE", str(tmp_path / "usage_limits.json"))
+    return usage_limits.USAGE_FILE
+
+@pytest.fixture
+def today():
+    """Today's date as usage_limits stores it."""
+    return time.strftime("%Y-%m-%d", time.localtime())
+
+def test_initialize_usage_file(usage_file):
+    """Test that the usage file is initialized correctly."""
+    usage_limits._initialize_usage_file()
     
-    def test_initialize_usage_file(self):
-        """Test that the usage file is initialized correctly."""
-        usage_limits._initialize_usage_file()
-        
-        # Check that the file exists
-        self.assertTrue(os.path.exists(usage_limits.USAGE_FILE))
-        
-        # Check that the file contains valid JSON with the expected structure
-        with open(usage_limits.USAGE_FILE, "r") as f:
-            data = json.load(f)
-        
-        self.assertIn("date", data)
-        self.assertIn("search_count", data)
-        self.assertIn("media_count", data)
-        
-        # Check that the counters are initialized to 0
-        self.assertEqual(data["search_count"], 0)
-        self.assertEqual(data["media_count"], 0)
-    
-    def test_reset_usage_if_new_day(self):
-        """Test that usage counters are reset on a new day."""
-        # Set up a file with yesterday's date
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-        with open(usage_limits.USAGE_FILE, "w") as f:
-            json.dump({
-                "date": yesterday,
-                "search_count": 10,
-                "media_count": 5
-            }, f)
-        
-        # Call the reset function
-        usage_limits._reset_usage_if_new_day()
-        
-        # Check that the file was updated with today's date and reset counters
-        with open(usage_limits.USAGE_FILE, "r") as f:
-            data = json.load(f)
-        
-        today = datetime.now().strftime("%Y-%m-%d")
-        self.assertEqual(data["date"], today)
-        self.assertEqual(data["search_count"], 0)
-        self.assertEqual(data["media_count"], 0)
-    
-    def test_update_usage_count(self):
-        """Test updating usage counts."""
-        # Initialize the file
-        usage_limits._initialize_usage_file()
-        
-        # Update search count
-        data = usage_limits._update_usage_count("search")
-        self.assertEqual(data["search_count"], 1)
-        
-        # Update again
-        data = usage_limits._update_usage_count("search")
-        self.assertEqual(data["search_count"], 2)
-        
-        # Update media count
-        data = usage_limits._update_usage_count("media")
-        self.assertEqual(data["media_count"], 1)
-    
-    def test_can_use_search(self):
-        """Test the search limit checking."""
-        # Initialize the file
-        usage_limits._initialize_usage_file()
-        
-        # Should be able to search initially
-        self.assertTrue(usage_limits.can_use_search())
-        
-        # Set search count to limit-1
-        limit = usage_limits.get_daily_limits()["search"]
-        with open(usage_limits.USAGE_FILE, "w") as f:
-            json.dump({
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "search_count": limit - 1,
-                "media_count": 0
-            }, f)
-        
-        # Should still be able to search
-        self.assertTrue(usage_limits.can_use_search())
-        
-        # Set search count to limit
-        with open(usage_limits.USAGE_FILE, "w") as f:
-            json.dump({
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "search_count": limit,
-                "media_count": 0
-            }, f)
-        
-        # Should not be able to search
-        self.assertFalse(usage_limits.can_use_search())
+    # Check that the file exists
+    assert os.path.exists(usage_file)
     
-    def test_can_process_media(self):
-        """Test the media processing limit checking."""
-        # Initialize the file
-        usage_limits._initialize_usage_file()
-        
-        # Should be able to process media initially
-        self.assertTrue(usage_limits.can_process_media())
-        
+    # Check that the file contains valid JSON with the expected structure
+    with open(usage_file, "rb") as f:
+        data = _loads(f.read())
+    
+    assert "date" in data
+    assert "search_count" in data
+    assert "media_count" in data
+    
+    # Check that the counters are initialized to 0
+    assert data["search_count"] == 0
+    assert data["media_count"] == 0
+
+def test_reset_usage_if_new_day(usage_file, today):
+    """Test that usage counters are reset on a new day."""
+    # Set up a file with yesterday's date
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    with open(usage_file, "wb") as f:
+        f.write(_dumps({
+            "date": yesterday,
+            "search_count": 10,
+            "media_count": 5
+        }))
+    
+    # Call the reset function
+    usage_limits._reset_usage_if_new_day()
+    
+    # Check that the file was updated with today's date and reset counters
+    with open(usage_file, "rb") as f:
+        data = _loads(f.read())
+    
+    assert data["date"] == today
+    assert data["search_count"] == 0
+    assert data["media_count"] == 0
+
+def test_update_usage_count():
+    """Test updating usage counts."""
+    # Initialize the file
+    usage_limits._initialize_usage_file()
+    
+    # Update search count
+    data = usage_limits._update_usage_count("search")
+    assert data["search_count"] == 1
+    
+    # Update again
+    data = usage_limits._update_usage_count("search")
+    assert data["search_count"] == 2
+    
+    # Update media count
+    data = usage_limits._update_usage_count("media")
+    assert data["media_count"] == 1
+
+def test_can_use_search(monkeypatch):
+    """Test the search limit checking."""
+    # Keep the limit small so the loop stays cheap
+    monkeypatch.setenv("DAILY_SEARCH_LIMIT", "3")
+    
+    # Initialize the file
+    usage_limits._initialize_usage_file()
+    
+    # Should be able to search until the count reaches the limit
+    limit = usage_limits.get_daily_limits()["search"]
+    for _ in range(limit):
+        assert usage_limits.can_use_search()
+        usage_limits._update_usage_count("search")
+    
+    # Should not be able to search
+    assert not usage_limits.can_use_search()
+
+def test_can_process_media(today):
+    """Test the media processing limit checking."""
+    # Initialize the file
+    usage_limits._initialize_usage_file()
+    
+    # Should be able to process media initially
+    assert usage_limits.can_process_media()
+    
+    # Serve the usage counts from memory instead of rewriting the file
+    limit = usage_limits.get_daily_limits()["media"]
+    with patch.object(usage_limits, "_read_usage") as mock_read:
         # Set media count to limit-1
-        limit = usage_limits.get_daily_limits()["media"]
-        with open(usage_limits.USAGE_FILE, "w") as f:
-            json.dump({
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "search_count": 0,
-                "media_count": limit - 1
-            }, f)
+        mock_read.return_value = {"date": today, "media_count": limit - 1, "search_count": 0}
         
         # Should still be able to process media
-        self.assertTrue(usage_limits.can_process_media())
+        assert usage_limits.can_process_media()
         
         # Set media count to limit
-        with open(usage_limits.USAGE_FILE, "w") as f:
-            json.dump({
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "search_count": 0,
-                "media_count": limit
-            }, f)
+        mock_read.return_value = {"date": today, "media_count": limit, "search_count": 0}
         
         # Should not be able to process media
-        self.assertFalse(usage_limits.can_process_media())
-    
-    def test_get_remaining_limits(self):
-        """Test getting remaining usage limits."""
-        # Create a test usage file with some usage
-        with open(usage_limits.USAGE_FILE, "w") as f:
-            json.dump({
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "search_count": 10,
-                "media_count": 5
-            }, f)
-        
-        # Set higher limits for testing
-        with patch.dict('os.environ', {'DAILY_SEARCH_LIMIT': '50', 'DAILY_MEDIA_LIMIT': '20'}):
-            # Get remaining limits
-            limits = usage_limits.get_remaining_limits()
-            
-            # Check if the limits are as expected
-            self.assertEqual(limits["search"], 40)  # 50 - 10
-            self.assertEqual(limits["media"], 15)   # 20 - 5
+        assert not usage_limits.can_process_media()
 
-if __name__ == "__main__":
-    unittest.main() 
\ No newline at end of file
+def test_get_remaining_limits(usage_file, today, monkeypatch):
+    """Test getting remaining usage limits."""
+    # Create a test usage file with some usage
+    with open(usage_file, "wb") as f:
+        f.write(_dumps({
+            "date": today,
+            "search_count": 10,
+            "media_count": 5
+        }))
+    
+    # Set higher limits for testing
+    monkeypatch.setenv("DAILY_SEARCH_LIMIT", "50")
+    monkeypatch.setenv("DAILY_MEDIA_LIMIT", "20")
+    
+    # Get remaining limits
+    limits = usage_limits.get_remaining_limits()
+    
+    # Check if the limits are as expected
+    assert limits["search"] == 40  # 50 - 10
+    assert limits["media"] == 15   # 20 - 5
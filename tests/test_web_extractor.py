@@ -1,104 +1,85 @@
 import os
-import unittest
-from unittest.mock import patch, MagicMock
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
 import sys
-import asyncio
 
 # Add parent directory to path so we can import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import web_extractor
+import http_session
 
-class TestWebExtractor(unittest.TestCase):
-    """Test cases for web content extraction functionality."""
-    
-    def run_async(self, coro):
-        """Run a coroutine in the event loop."""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(coro)
-        finally:
-            loop.close()
+@pytest.mark.parametrize("text,expected", [
+    # Single URL
+    ("Check out this website: https://example.com", ["https://example.com"]),
+    # Multiple URLs, including a query string
+    ("First site: https://example.com and second site: http://test.org/page?q=123",
+     ["https://example.com", "http://test.org/page?q=123"]),
+    # No URLs
+    ("This text has no URLs in it.", []),
+])
+def test_extract_urls(text, expected):
+    """Test URL extraction from text."""
+    assert web_extractor.extract_urls(text) == expected
+
+@pytest.fixture
+def client_session(monkeypatch):
+    """Disable Playwright and serve a mocked shared HTTP session with its get() context manager wired; returns (session, response)."""
+    monkeypatch.setattr(web_extractor, "async_playwright", MagicMock(side_effect=RuntimeError("no browser")))
+    session = MagicMock()
+    response = MagicMock()
+    session.get.return_value.__aenter__.return_value = response
+    monkeypatch.setattr(http_session, "get_http_session", AsyncMock(return_value=session))
+    return session, response
+
+@pytest.mark.asyncio
+async def test_extract_content_from_url_success(client_session):
+    """Test successful content extraction from URL."""
+    _, mock_response = client_session
     
-    def test_extract_urls(self):
-        """Test URL extraction from text."""
-        # Test with single URL
-        text = "Check out this website: https://example.com"
-        urls = web_extractor.extract_urls(text)
-        self.assertEqual(len(urls), 1)
-        self.assertEqual(urls[0], "https://example.com")
-        
-        # Test with multiple URLs - adjust to match the actual implementation
-        text = "First site: https://example.com and second site: http://test.org/page?q=123"
-        urls = web_extractor.extract_urls(text)
-        self.assertEqual(len(urls), 2)
-        self.assertEqual(urls[0], "https://example.com")
-        # Just check it contains test.org without being strict about query parameters
-        self.assertTrue("http://test.org" in urls[1])
-        
-        # Test with no URLs
-        text = "This text has no URLs in it."
-        urls = web_extractor.extract_urls(text)
-        self.assertEqual(len(urls), 0)
+    # Mock the response
+    mock_response.status = 200
+    mock_response.text = AsyncMock(return_value="""
+    <html>
+        <head>
+            <title>Test Page</title>
+        </head>
+        <body>
+            <p>This is the first paragraph with enough text to be considered content.</p>
+            <p>This is a second paragraph with more interesting content that should be extracted.</p>
+            <p class="footer">Copyright 2023</p>
+        </body>
+    </html>
+    """)
     
-    @patch("aiohttp.ClientSession")
-    def test_extract_content_from_url_success(self, mock_session):
-        """Test successful content extraction from URL."""
-        # Mock the response
-        mock_response = MagicMock()
-        mock_response.status = 200
-        mock_response.text = MagicMock(return_value=asyncio.Future())
-        mock_response.text.return_value.set_result("""
-        <html>
-            <head>
-                <title>Test Page</title>
-            </head>
-            <body>
-                <p>This is the first paragraph with enough text to be considered content.</p>
-                <p>This is a second paragraph with more interesting content that should be extracted.</p>
-                <p class="footer">Copyright 2023</p>
-            </body>
-        </html>
-        """)
-        
-        # Mock the session
-        mock_session_instance = MagicMock()
-        mock_session.return_value.__aenter__.return_value = mock_session_instance
-        mock_session_instance.get.return_value.__aenter__.return_value = mock_response
-        
-        # Call the function
-        title, content = self.run_async(web_extractor.extract_content_from_url("https://example.com"))
-        
-        # Check the results
-        self.assertEqual(title, "Test Page")
-        self.assertIn("first paragraph", content)
-        self.assertIn("interesting content", content)
+    # Call the function
+    content = await web_extractor.extract_content_from_url("https://example.com")
     
-    @patch("aiohttp.ClientSession")
-    def test_extract_content_from_url_error(self, mock_session):
-        """Test error handling in content extraction."""
-        # Make the session raise an exception
-        mock_session_instance = MagicMock()
-        mock_session.return_value.__aenter__.return_value = mock_session_instance
-        mock_session_instance.get.side_effect = Exception("Connection error")
-        
-        # Call the function
-        title, content = self.run_async(web_extractor.extract_content_from_url("https://example.com"))
-        
-        # Check the results
-        self.assertEqual(title, "Error")
-        self.assertIn("Could not extract content", content)
+    # Check the results
+    assert content.startswith("عنوان: Test Page\n\n")
+    assert "first paragraph" in content
+    assert "interesting content" in content
+
+@pytest.mark.asyncio
+async def test_extract_content_from_url_error(client_session):
+    """Test error handling in content extraction."""
+    # Make the session raise an exception
+    mock_session_instance, _ = client_session
+    mock_session_instance.get.side_effect = Exception("Connection error")
     
-    def test_is_valid_url(self):
-        """Test URL validation."""
-        self.assertTrue(web_extractor.is_valid_url("https://example.com"))
-        self.assertTrue(web_extractor.is_valid_url("http://subdomain.example.com/path?query=value"))
-        self.assertFalse(web_extractor.is_valid_url("not a url"))
-        self.assertFalse(web_extractor.is_valid_url("example.com"))  # Missing scheme
-        self.assertFalse(web_extractor.is_valid_url("https://"))  # Missing domain
+    # Call the function
+    content = await web_extractor.extract_content_from_url("https://example.com")
     
-    # The following tests for process_message_links have been removed as the function is no longer used
+    # Check the results
+    assert content.startswith("خطا:")
+    assert "Connection error" in content
+
+def test_is_valid_url():
+    """Test URL validation."""
+    assert web_extractor.is_valid_url("https://example.com")
+    assert web_extractor.is_valid_url("http://subdomain.example.com/path?query=value")
+    assert not web_extractor.is_valid_url("not a url")
+    assert not web_extractor.is_valid_url("example.com")  # Missing scheme
+    assert not web_extractor.is_valid_url("https://")  # Missing domain
 
-if __name__ == "__main__":
-    unittest.main() 
\ No newline at end of file
+# The following tests for process_message_links have been removed as the function is no longer used
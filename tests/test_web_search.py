@@ -1,7 +1,6 @@
 import os
 import unittest
 from unittest.mock import patch, MagicMock
-import json
 import sys
 import asyncio
 import re
@@ -44,12 +43,7 @@ class TestWebSearch(unittest.TestCase):
     
     def run_async(self, coro):
         """Run a coroutine in the event loop."""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(coro)
-        finally:
-            loop.close()
+        return asyncio.run(coro)
     
     @patch("web_search.requests.get")
     @patch("usage_limits.can_use_search")
@@ -1,10 +1,13 @@
 import os
 import json
 import logging
+import functools
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, Tuple
 import sqlite3
 import threading
+import queue
+import atexit
 
 logger = logging.getLogger(__name__)
 
@@ -41,16 +44,16 @@ _local.session_tokens = {
     "models": {}
 }
 
-def _init_database():
-    """Initialize the SQLite database for token tracking if it doesn't exist."""
-    conn = sqlite3.connect(TOKEN_DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create token usage table for detailed logs
-    cursor.execute('''
+# Single connection shared by all calls, opened on first use; sqlite3 connections
+# aren't safe to use from several threads at once, so every use holds the lock
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+# Detailed usage log; timestamp is Unix epoch seconds
+TOKEN_USAGE_SCHEMA = '''
     CREATE TABLE IF NOT EXISTS token_usage (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
         model TEXT NOT NULL,
         request_type TEXT NOT NULL,
         prompt_tokens INTEGER NOT NULL,
@@ -58,6 +61,37 @@ def _init_database():
         total_tokens INTEGER NOT NULL,
         estimated_cost REAL NOT NULL
     )
+    '''
+
+def _migrate_text_timestamps(cursor: sqlite3.Cursor):
+    """Rebuild a token_usage table that stored local ISO timestamps so it uses epoch seconds."""
+    cursor.execute("ALTER TABLE token_usage RENAME TO token_usage_old")
+    cursor.execute("DROP INDEX IF EXISTS idx_token_usage_timestamp_model")
+    cursor.execute(TOKEN_USAGE_SCHEMA)
+    cursor.execute(
+        "INSERT INTO token_usage (id, timestamp, model, request_type, prompt_tokens, completion_tokens, total_tokens, estimated_cost) "
+        "SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER), model, request_type, "
+        "prompt_tokens, completion_tokens, total_tokens, estimated_cost FROM token_usage_old"
+    )
+    cursor.execute("DROP TABLE token_usage_old")
+    logger.info("Migrated token_usage timestamps to epoch seconds")
+
+def _init_database(conn: sqlite3.Connection):
+    """Create the token tracking tables if they don't exist."""
+    cursor = conn.cursor()
+    
+    # Create token usage table for detailed logs
+    cursor.execute(TOKEN_USAGE_SCHEMA)
+    
+    # Databases created before timestamps were integers need rebuilding
+    columns = {row[1]: row[2] for row in cursor.execute("PRAGMA table_info(token_usage)")}
+    if columns.get("timestamp") == "TEXT":
+        _migrate_text_timestamps(cursor)
+    
+    # Index the reporting range scans (WHERE timestamp >= ? ... GROUP BY model)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_token_usage_timestamp_model
+    ON token_usage (timestamp, model)
     ''')
     
     # Create daily summary table for aggregated stats
@@ -73,26 +107,142 @@ def _init_database():
     ''')
     
     conn.commit()
-    conn.close()
     logger.info("Token tracking database initialized")
 
-def _calculate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
-    """Calculate the estimated cost for the token usage."""
-    model_lower = model.lower()
-    
-    # Find the pricing for the model
-    pricing = MODEL_PRICES.get(model_lower)
-    if not pricing:
-        # Try to match by prefix (e.g. gpt-4o-2024-05-13 would match to gpt-4o)
-        for key in MODEL_PRICES:
-            if model_lower.startswith(key):
-                pricing = MODEL_PRICES[key]
+def _connect() -> sqlite3.Connection:
+    """Open the token tracking database and make sure its tables exist."""
+    conn = sqlite3.connect(TOKEN_DB_PATH, check_same_thread=False)
+    
+    # WAL lets summary reads run alongside writes, and with synchronous=NORMAL
+    # commits no longer fsync on every tracked request
+    conn.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA temp_store=MEMORY;"
+    )
+    _init_database(conn)
+    return conn
+
+# Background writer thread, started by the first tracked request
+_writer: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+def _get_connection() -> sqlite3.Connection:
+    """Return the shared connection, opening the database the first time it's needed."""
+    global _conn
+    with _start_lock:
+        if _conn is None:
+            _conn = _connect()
+        return _conn
+
+def _start_writer():
+    """Start the writer thread once, and flush it when the process exits."""
+    global _writer
+    with _start_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="token-usage-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush_token_usage)
+
+# Usage rows waiting to be written; a single background thread drains them
+# so tracking never waits on the database
+_write_queue: "queue.Queue[tuple]" = queue.Queue()
+
+def _write_usage_rows(rows):
+    """Insert a batch of usage rows and fold them into the daily summary in one transaction."""
+    # Sum the batch per day so each summary row is touched once
+    daily = {}
+    for row in rows:
+        day = daily.setdefault(row[0], [0, 0, 0, 0, 0.0])
+        day[0] += row[4]
+        day[1] += row[5]
+        day[2] += row[6]
+        day[3] += 1
+        day[4] += row[7]
+    
+    conn = _get_connection()
+    with _conn_lock, conn:
+        cursor = conn.cursor()
+        
+        # Insert detailed logs
+        cursor.executemany(
+            "INSERT INTO token_usage (timestamp, model, request_type, prompt_tokens, completion_tokens, total_tokens, estimated_cost) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [row[1:] for row in rows]
+        )
+        
+        # Add the day's totals, creating its summary row if needed
+        cursor.executemany(
+            "INSERT INTO daily_summary (date, total_prompt_tokens, total_completion_tokens, total_tokens, total_requests, total_cost) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(date) DO UPDATE SET "
+            "total_prompt_tokens = total_prompt_tokens + excluded.total_prompt_tokens, "
+            "total_completion_tokens = total_completion_tokens + excluded.total_completion_tokens, "
+            "total_tokens = total_tokens + excluded.total_tokens, "
+            "total_requests = total_requests + excluded.total_requests, "
+            "total_cost = total_cost + excluded.total_cost",
+            [(date, *totals) for date, totals in daily.items()]
+        )
+
+# Rows from a failed write are retried with the next batch; at most this many
+# are kept, and the writer retries on its own after WRITE_RETRY_DELAY seconds
+MAX_RETRY_ROWS = 10000
+WRITE_RETRY_DELAY = 5.0
+
+def _writer_loop():
+    """Write queued usage rows, batching whatever has piled up since the last commit."""
+    retry_rows = []
+    while True:
+        try:
+            rows = [_write_queue.get(timeout=WRITE_RETRY_DELAY if retry_rows else None)]
+        except queue.Empty:
+            rows = []
+        while True:
+            try:
+                rows.append(_write_queue.get_nowait())
+            except queue.Empty:
                 break
         
-        # Use default pricing if no match found
-        if not pricing:
-            pricing = MODEL_PRICES["default"]
-            logger.warning(f"Using default pricing for unknown model: {model}")
+        batch = retry_rows + rows
+        try:
+            _write_usage_rows(batch)
+            retry_rows = []
+        except Exception as e:
+            # The transaction rolled back, so the whole batch can be written again later
+            logger.error(f"Error writing {len(batch)} token usage rows, will retry: {e}")
+            if len(batch) > MAX_RETRY_ROWS:
+                logger.error(f"Dropped {len(batch) - MAX_RETRY_ROWS} oldest unwritten token usage rows")
+            retry_rows = batch[-MAX_RETRY_ROWS:]
+        finally:
+            for _ in rows:
+                _write_queue.task_done()
+
+def flush_token_usage():
+    """Block until every tracked usage row has had a write attempt; failed rows are retried later."""
+    _write_queue.join()
+
+# Priced model names, longest first so the most specific prefix wins
+_PRICE_PREFIXES = sorted((key for key in MODEL_PRICES if key != "default"), key=len, reverse=True)
+
+@functools.lru_cache(maxsize=256)
+def _resolve_pricing(model_lower: str) -> Dict[str, float]:
+    """Find the pricing for a lowercased model name, remembering the answer."""
+    pricing = MODEL_PRICES.get(model_lower)
+    if pricing:
+        return pricing
+    
+    # Try to match by prefix (e.g. gpt-4o-2024-05-13 would match to gpt-4o)
+    for key in _PRICE_PREFIXES:
+        if model_lower.startswith(key):
+            return MODEL_PRICES[key]
+    
+    # Use default pricing if no match found
+    logger.warning(f"Using default pricing for unknown model: {model_lower}")
+    return MODEL_PRICES["default"]
+
+def _calculate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Calculate the estimated cost for the token usage."""
+    pricing = _resolve_pricing(model.lower())
     
     # Calculate costs (price is per 1K tokens)
     input_cost = (prompt_tokens / 1000) * pricing["input"]
@@ -103,7 +253,7 @@ def _calculate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> f
 def track_token_usage(model: str, request_type: str, prompt_tokens: int, 
                      completion_tokens: int, total_tokens: int) -> Dict[str, Any]:
     """
-    Track token usage for an API call and update the database.
+    Track token usage for an API call and queue it for the database.
     
     Args:
         model: The model used (e.g., "gpt-4o")
@@ -115,57 +265,21 @@ def track_token_usage(model: str, request_type: str, prompt_tokens: int,
     Returns:
         Dictionary with token usage information including cost
     """
-    # Ensure database exists
-    if not os.path.exists(TOKEN_DB_PATH):
-        _init_database()
-    
     # Calculate cost
     estimated_cost = _calculate_cost(model, prompt_tokens, completion_tokens)
     
     # Current timestamp
-    timestamp = datetime.now().isoformat()
-    
-    # Store in database
-    conn = sqlite3.connect(TOKEN_DB_PATH)
-    cursor = conn.cursor()
-    
-    # Insert detailed log
-    cursor.execute(
-        "INSERT INTO token_usage (timestamp, model, request_type, prompt_tokens, completion_tokens, total_tokens, estimated_cost) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (timestamp, model, request_type, prompt_tokens, completion_tokens, total_tokens, estimated_cost)
+    now = datetime.now()
+    timestamp = int(now.timestamp())
+    
+    # Queue the row for the writer thread
+    if _writer is None:
+        _start_writer()
+    today = now.strftime("%Y-%m-%d")
+    _write_queue.put_nowait(
+        (today, timestamp, model, request_type, prompt_tokens, completion_tokens, total_tokens, estimated_cost)
     )
     
-    # Update daily summary
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    # Check if today exists in summary
-    cursor.execute("SELECT * FROM daily_summary WHERE date = ?", (today,))
-    row = cursor.fetchone()
-    
-    if row:
-        # Update existing row
-        cursor.execute(
-            "UPDATE daily_summary SET "
-            "total_prompt_tokens = total_prompt_tokens + ?, "
-            "total_completion_tokens = total_completion_tokens + ?, "
-            "total_tokens = total_tokens + ?, "
-            "total_requests = total_requests + 1, "
-            "total_cost = total_cost + ? "
-            "WHERE date = ?",
-            (prompt_tokens, completion_tokens, total_tokens, estimated_cost, today)
-        )
-    else:
-        # Insert new row
-        cursor.execute(
-            "INSERT INTO daily_summary (date, total_prompt_tokens, total_completion_tokens, total_tokens, total_requests, total_cost) "
-            "VALUES (?, ?, ?, ?, ?, ?)",
-            (today, prompt_tokens, completion_tokens, total_tokens, 1, estimated_cost)
-        )
-    
-    conn.commit()
-    conn.close()
-    
     # Update in-memory session tracking
     _local.session_tokens["total_prompt_tokens"] += prompt_tokens
     _local.session_tokens["total_completion_tokens"] += completion_tokens  
@@ -208,51 +322,41 @@ def get_token_usage_summary(days: int = 30) -> Dict[str, Any]:
     Returns:
         Dictionary with token usage summary
     """
-    if not os.path.exists(TOKEN_DB_PATH):
-        _init_database()
-        return {
-            "period_days": days,
-            "total_prompt_tokens": 0,
-            "total_completion_tokens": 0,
-            "total_tokens": 0,
-            "total_requests": 0,
-            "total_cost": 0,
-            "daily_usage": [],
-            "model_usage": {}
-        }
+    # Make sure rows still in the queue are counted
+    flush_token_usage()
     
     # Calculate the start date
-    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-    
-    # Connect to database
-    conn = sqlite3.connect(TOKEN_DB_PATH)
-    cursor = conn.cursor()
+    start_day = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = start_day.strftime("%Y-%m-%d")
+    start_ts = int(start_day.timestamp())
     
-    # Get daily summary
-    cursor.execute(
-        "SELECT date, total_prompt_tokens, total_completion_tokens, total_tokens, total_requests, total_cost "
-        "FROM daily_summary WHERE date >= ? ORDER BY date",
-        (start_date,)
-    )
-    daily_rows = cursor.fetchall()
-    
-    # Get model summary
-    cursor.execute(
-        "SELECT model, SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens), COUNT(*), SUM(estimated_cost) "
-        "FROM token_usage WHERE timestamp >= ? GROUP BY model",
-        (start_date,)
-    )
-    model_rows = cursor.fetchall()
-    
-    # Get overall summary
-    cursor.execute(
-        "SELECT SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens), COUNT(*), SUM(estimated_cost) "
-        "FROM token_usage WHERE timestamp >= ?",
-        (start_date,)
-    )
-    overall = cursor.fetchone()
-    
-    conn.close()
+    conn = _get_connection()
+    with _conn_lock:
+        cursor = conn.cursor()
+        
+        # Get daily summary
+        cursor.execute(
+            "SELECT date, total_prompt_tokens, total_completion_tokens, total_tokens, total_requests, total_cost "
+            "FROM daily_summary WHERE date >= ? ORDER BY date",
+            (start_date,)
+        )
+        daily_rows = cursor.fetchall()
+        
+        # Get model summary
+        cursor.execute(
+            "SELECT model, SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens), COUNT(*), SUM(estimated_cost) "
+            "FROM token_usage WHERE timestamp >= ? GROUP BY model",
+            (start_ts,)
+        )
+        model_rows = cursor.fetchall()
+        
+        # Get overall summary
+        cursor.execute(
+            "SELECT SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens), COUNT(*), SUM(estimated_cost) "
+            "FROM token_usage WHERE timestamp >= ?",
+            (start_ts,)
+        )
+        overall = cursor.fetchone()
     
     # Process data
     total_prompt_tokens = overall[0] or 0
@@ -309,13 +413,16 @@ def reset_session_token_usage():
         "models": {}
     }
 
-def format_token_usage_report(days: int = 30, include_session: bool = True) -> str:
+def format_token_usage_report(days: int = 30, include_session: bool = True,
+                              session_usage: Optional[Dict[str, Any]] = None) -> str:
     """
     Format a token usage report as a human-readable string.
     
     Args:
         days: Number of days to include in the report
         include_session: Whether to include current session stats
+        session_usage: Session stats to report, for callers on another thread;
+            defaults to the calling thread's session
         
     Returns:
         A formatted string with the token usage report
@@ -342,7 +449,7 @@ def format_token_usage_report(days: int = 30, include_session: bool = True) -> s
     
     # Add session info if requested
     if include_session:
-        session = get_session_token_usage()
+        session = session_usage if session_usage is not None else get_session_token_usage()
         report.extend([
             "",
             "--- Current Session ---",
@@ -354,7 +461,3 @@ def format_token_usage_report(days: int = 30, include_session: bool = True) -> s
             report.append(f"  {model}: {usage['total_tokens']:,} tokens, ${usage['cost']:.4f}")
     
     return "\n".join(report)
-
-# Initialize the database on module import
-if not os.path.exists(TOKEN_DB_PATH):
-    _init_database() 
\ No newline at end of file
@@ -14,6 +14,17 @@ USAGE_FILE = os.path.join(DATA_DIR, "usage_limits.json")
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Prefer orjson for the usage file when it's installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps(data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
 # Default daily limits (can be overridden by environment variables)
 DEFAULT_SEARCH_LIMIT = 50
 DEFAULT_MEDIA_LIMIT = 10
@@ -25,16 +36,25 @@ def get_daily_limits() -> Dict[str, int]:
         "media": int(os.getenv("DAILY_MEDIA_LIMIT", DEFAULT_MEDIA_LIMIT))
     }
 
+def _read_usage() -> Dict[str, Any]:
+    """Load the usage file."""
+    with open(USAGE_FILE, "rb") as f:
+        return _json_loads(f.read())
+
+def _write_usage(data: Dict[str, Any]):
+    """Write the usage file."""
+    with open(USAGE_FILE, "wb") as f:
+        f.write(_json_dumps(data))
+
 def _initialize_usage_file():
     """Initialize the usage file if it doesn't exist."""
     if not os.path.exists(USAGE_FILE):
         today = datetime.now().strftime("%Y-%m-%d")
-        with open(USAGE_FILE, "w", encoding="utf-8") as f:
-            json.dump({
-                "date": today,
-                "search_count": 0,
-                "media_count": 0
-            }, f, ensure_ascii=False, indent=2)
+        _write_usage({
+            "date": today,
+            "search_count": 0,
+            "media_count": 0
+        })
         logger.info(f"Created new usage limits file at {USAGE_FILE}")
 
 def _reset_usage_if_new_day():
@@ -44,8 +64,7 @@ def _reset_usage_if_new_day():
         _initialize_usage_file()
         
         # Check if we need to reset for a new day
-        with open(USAGE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_usage()
         
         today = datetime.now().strftime("%Y-%m-%d")
         if data["date"] != today:
@@ -54,8 +73,7 @@ def _reset_usage_if_new_day():
             data["search_count"] = 0
             data["media_count"] = 0
             
-            with open(USAGE_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            _write_usage(data)
             
             logger.info(f"Reset usage limits for new day: {today}")
             
@@ -78,8 +96,7 @@ def _update_usage_count(usage_type: str, increment: int = 1) -> Dict[str, Any]:
         _reset_usage_if_new_day()
         
         # Read current data
-        with open(USAGE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_usage()
         
         # Update count
         count_key = f"{usage_type}_count"
@@ -89,8 +106,7 @@ def _update_usage_count(usage_type: str, increment: int = 1) -> Dict[str, Any]:
             data[count_key] = increment
         
         # Write updated data
-        with open(USAGE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_usage(data)
         
         return data
     except Exception as e:
@@ -105,8 +121,7 @@ def can_use_search() -> bool:
         _reset_usage_if_new_day()
         
         # Read current data
-        with open(USAGE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_usage()
         
         # Get limit from environment or default
         limit = get_daily_limits()["search"]
@@ -129,8 +144,7 @@ def can_process_media() -> bool:
         _reset_usage_if_new_day()
         
         # Read current data
-        with open(USAGE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_usage()
         
         # Get limit from environment or default
         limit = get_daily_limits()["media"]
@@ -174,8 +188,7 @@ def get_remaining_limits() -> Dict[str, int]:
         _reset_usage_if_new_day()
         
         # Read current data
-        with open(USAGE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_usage()
             
         # Get limits from environment or defaults
         limits = get_daily_limits()
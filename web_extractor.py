@@ -18,6 +18,8 @@ import os
 import psutil
 import gc
 
+import http_session
+
 # Check if Brotli is available
 try:
     import brotli
@@ -40,6 +42,13 @@ DEFAULT_HEADERS = {
     "Cache-Control": "max-age=0"
 }
 
+# URLs in message text, compiled once at import
+URL_RE = re.compile(r'https?://[^\s<>"\']+')
+
+# Whitespace clean-up patterns for extracted page text
+BLANK_LINES_RE = re.compile(r'\n\s*\n')
+SPACE_RUN_RE = re.compile(r' +')
+
 async def extract_content_from_url(url: str, max_length: int = 10000) -> Optional[str]:
     """
     Extract and summarize content from a URL using Playwright.
@@ -159,37 +168,37 @@ async def extract_content_from_url(url: str, max_length: int = 10000) -> Optiona
     # Fallback to basic extraction if Playwright fails
     try:
         logger.info(f"Using fallback extraction method for {url}")
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=DEFAULT_HEADERS, timeout=20) as response:
-                    if response.status != 200:
-                        return f"خطا: سرور پاسخ نامعتبر برگرداند (کد وضعیت {response.status})"
+        session = await http_session.get_http_session()
+        try:
+            async with session.get(url, headers=DEFAULT_HEADERS, timeout=20) as response:
+                if response.status != 200:
+                    return f"خطا: سرور پاسخ نامعتبر برگرداند (کد وضعیت {response.status})"
                     
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
+                html = await response.text()
+                soup = BeautifulSoup(html, 'html.parser')
                     
-                    # Get the title
-                    title = soup.title.text.strip() if soup.title else "No Title"
+                # Get the title
+                title = soup.title.text.strip() if soup.title else "No Title"
                     
-                    # Remove unwanted elements
-                    for element in soup.select('script, style, nav, footer, header'):
-                        element.decompose()
+                # Remove unwanted elements
+                for element in soup.select('script, style, nav, footer, header'):
+                    element.decompose()
                     
-                    # Get all text
-                    text = soup.get_text(separator='\n', strip=True)
+                # Get all text
+                text = soup.get_text(separator='\n', strip=True)
                     
-                    # Clean up the text
-                    text = clean_extracted_text(text)
+                # Clean up the text
+                text = clean_extracted_text(text)
                     
-                    # Truncate if too long
-                    if len(text) > max_length:
-                        text = text[:max_length] + "..."
+                # Truncate if too long
+                if len(text) > max_length:
+                    text = text[:max_length] + "..."
                     
-                    return f"عنوان: {title}\n\n{text}"
+                return f"عنوان: {title}\n\n{text}"
                     
-            except Exception as e:
-                logger.error(f"Fallback extraction failed: {e}", exc_info=True)
-                return f"خطا: نتوانستم محتوای وب‌سایت را استخراج کنم: {str(e)}"
+        except Exception as e:
+            logger.error(f"Fallback extraction failed: {e}", exc_info=True)
+            return f"خطا: نتوانستم محتوای وب‌سایت را استخراج کنم: {str(e)}"
                 
     except Exception as e:
         logger.error(f"Error in content extraction: {e}", exc_info=True)
@@ -217,13 +226,17 @@ def clean_url(url: str) -> str:
     
     return url
 
+def extract_urls(text: Optional[str]) -> List[str]:
+    """Return the http(s) URLs found in a message text, or an empty list for no text."""
+    return URL_RE.findall(text or "")
+
 def clean_extracted_text(text: str) -> str:
     """Clean up extracted text by removing extra whitespace and normalizing line breaks."""
     # Replace multiple newlines with a single newline
-    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = BLANK_LINES_RE.sub('\n\n', text)
     
     # Replace multiple spaces with a single space
-    text = re.sub(r' +', ' ', text)
+    text = SPACE_RUN_RE.sub(' ', text)
     
     # Remove very short lines (likely menu items or buttons)
     lines = [line for line in text.splitlines() if len(line.strip()) > 30]
@@ -247,40 +260,40 @@ async def determine_content_type(url: str) -> str:
     
     for attempt in range(max_retries):
         try:
-            async with aiohttp.ClientSession() as session:
-                try:
-                    # First try a HEAD request to check the content type
-                    async with session.head(url, headers=DEFAULT_HEADERS, timeout=10, allow_redirects=True) as response:
-                        content_type = response.headers.get('Content-Type', '').lower()
+            session = await http_session.get_http_session()
+            try:
+                # First try a HEAD request to check the content type
+                async with session.head(url, headers=DEFAULT_HEADERS, timeout=10, allow_redirects=True) as response:
+                    content_type = response.headers.get('Content-Type', '').lower()
                         
-                        # Parse the content type
-                        if 'text/html' in content_type:
-                            return "html"
-                        elif 'application/json' in content_type:
-                            return "json"
-                        elif 'application/pdf' in content_type:
-                            return "pdf"
-                        elif 'application/msword' in content_type or 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' in content_type:
-                            return "doc"
-                        # Fall through to try more methods
+                    # Parse the content type
+                    if 'text/html' in content_type:
+                        return "html"
+                    elif 'application/json' in content_type:
+                        return "json"
+                    elif 'application/pdf' in content_type:
+                        return "pdf"
+                    elif 'application/msword' in content_type or 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' in content_type:
+                        return "doc"
+                    # Fall through to try more methods
                 
-                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.warning(f"HEAD request failed for {url}: {e} (attempt {attempt+1}/{max_retries})")
-                    if attempt == max_retries - 1:  # Last attempt
-                        # If we couldn't make a HEAD request, try to guess from the URL
-                        if url.endswith('.pdf'):
-                            return "pdf"
-                        elif url.endswith('.json'):
-                            return "json"
-                        elif url.endswith('.doc') or url.endswith('.docx'):
-                            return "doc"
-                        else:
-                            # Default to HTML for most URLs
-                            return "html"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"HEAD request failed for {url}: {e} (attempt {attempt+1}/{max_retries})")
+                if attempt == max_retries - 1:  # Last attempt
+                    # If we couldn't make a HEAD request, try to guess from the URL
+                    if url.endswith('.pdf'):
+                        return "pdf"
+                    elif url.endswith('.json'):
+                        return "json"
+                    elif url.endswith('.doc') or url.endswith('.docx'):
+                        return "doc"
                     else:
-                        # Wait before retrying
-                        await asyncio.sleep(retry_delay * (attempt + 1))
-                        continue
+                        # Default to HTML for most URLs
+                        return "html"
+                else:
+                    # Wait before retrying
+                    await asyncio.sleep(retry_delay * (attempt + 1))
+                    continue
             
             # If we got here without determining the type, default to HTML
             return "html"
@@ -305,71 +318,71 @@ async def extract_html_content(url: str) -> Optional[str]:
     
     for attempt in range(max_retries):
         try:
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.get(url, headers=DEFAULT_HEADERS, timeout=15) as response:
-                        if response.status != 200:
-                            logger.error(f"Failed to fetch HTML content: status {response.status} (attempt {attempt+1}/{max_retries})")
-                            if attempt < max_retries - 1:
-                                await asyncio.sleep(retry_delay * (attempt + 1))
-                                continue
-                            else:
-                                return f"خطا: سرور پاسخ نامعتبر برگرداند (کد وضعیت {response.status})"
+            session = await http_session.get_http_session()
+            try:
+                async with session.get(url, headers=DEFAULT_HEADERS, timeout=15) as response:
+                    if response.status != 200:
+                        logger.error(f"Failed to fetch HTML content: status {response.status} (attempt {attempt+1}/{max_retries})")
+                        if attempt < max_retries - 1:
+                            await asyncio.sleep(retry_delay * (attempt + 1))
+                            continue
+                        else:
+                            return f"خطا: سرور پاسخ نامعتبر برگرداند (کد وضعیت {response.status})"
                         
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
+                    html = await response.text()
+                    soup = BeautifulSoup(html, 'html.parser')
                         
-                        # Remove unwanted elements
-                        for element in soup.select('script, style, nav, footer, header, [class*="menu"], [class*="sidebar"], [class*="ad"], [class*="banner"], iframe'):
-                            element.decompose()
+                    # Remove unwanted elements
+                    for element in soup.select('script, style, nav, footer, header, [class*="menu"], [class*="sidebar"], [class*="ad"], [class*="banner"], iframe'):
+                        element.decompose()
                         
-                        # Extract title
-                        title = soup.title.text.strip() if soup.title else "No Title"
+                    # Extract title
+                    title = soup.title.text.strip() if soup.title else "No Title"
                         
-                        # Try to find the main content
-                        main_content = None
+                    # Try to find the main content
+                    main_content = None
                         
-                        # Look for common content containers
-                        content_containers = soup.select('article, [class*="content"], [class*="post"], [class*="article"], main, #content, .content, .post, .article')
-                        if content_containers:
-                            # Use the largest content container by text length
-                            main_content = max(content_containers, key=lambda x: len(x.text.strip()))
+                    # Look for common content containers
+                    content_containers = soup.select('article, [class*="content"], [class*="post"], [class*="article"], main, #content, .content, .post, .article')
+                    if content_containers:
+                        # Use the largest content container by text length
+                        main_content = max(content_containers, key=lambda x: len(x.text.strip()))
                         
-                        # If no content container found, try to find the largest text block
-                        if not main_content or len(main_content.text.strip()) < 100:
-                            paragraphs = soup.find_all('p')
-                            if paragraphs:
-                                # Find the div that contains the most paragraphs
-                                paragraph_parents = {}
-                                for p in paragraphs:
-                                    parent = p.parent
-                                    if parent not in paragraph_parents:
-                                        paragraph_parents[parent] = 0
-                                    paragraph_parents[parent] += 1
+                    # If no content container found, try to find the largest text block
+                    if not main_content or len(main_content.text.strip()) < 100:
+                        paragraphs = soup.find_all('p')
+                        if paragraphs:
+                            # Find the div that contains the most paragraphs
+                            paragraph_parents = {}
+                            for p in paragraphs:
+                                parent = p.parent
+                                if parent not in paragraph_parents:
+                                    paragraph_parents[parent] = 0
+                                paragraph_parents[parent] += 1
                                 
-                                if paragraph_parents:
-                                    main_content = max(paragraph_parents.keys(), key=lambda x: paragraph_parents[x])
+                            if paragraph_parents:
+                                main_content = max(paragraph_parents.keys(), key=lambda x: paragraph_parents[x])
                         
-                        # If we still don't have main content, use the body
-                        if not main_content:
-                            main_content = soup.body
+                    # If we still don't have main content, use the body
+                    if not main_content:
+                        main_content = soup.body
                         
-                        if not main_content:
-                            return f"عنوان: {title}\n\nمتأسفانه نتوانستم محتوای اصلی را از این صفحه استخراج کنم."
+                    if not main_content:
+                        return f"عنوان: {title}\n\nمتأسفانه نتوانستم محتوای اصلی را از این صفحه استخراج کنم."
                         
-                        # Extract text and clean it up
-                        content_text = clean_extracted_text(main_content.get_text("\n", strip=True))
+                    # Extract text and clean it up
+                    content_text = clean_extracted_text(main_content.get_text("\n", strip=True))
                         
-                        return f"عنوان: {title}\n\n{content_text}"
+                    return f"عنوان: {title}\n\n{content_text}"
                         
-                except aiohttp.ClientError as e:
-                    # Special handling for Brotli compression errors
-                    if 'brotli' in str(e).lower() or 'content-encoding: br' in str(e).lower():
-                        if not BROTLI_AVAILABLE:
-                            logger.error(f"Brotli compression is used by {url} but Brotli package is not installed")
-                            return f"⚠️ نتوانستم محتوای وب‌سایت {url} را استخراج کنم زیرا از فشرده‌سازی Brotli استفاده می‌کند. برای دسترسی به این وب‌سایت، نیاز به نصب کتابخانه Brotli است."
-                    logger.error(f"Error fetching URL: {e}")
-                    return None
+            except aiohttp.ClientError as e:
+                # Special handling for Brotli compression errors
+                if 'brotli' in str(e).lower() or 'content-encoding: br' in str(e).lower():
+                    if not BROTLI_AVAILABLE:
+                        logger.error(f"Brotli compression is used by {url} but Brotli package is not installed")
+                        return f"⚠️ نتوانستم محتوای وب‌سایت {url} را استخراج کنم زیرا از فشرده‌سازی Brotli استفاده می‌کند. برای دسترسی به این وب‌سایت، نیاز به نصب کتابخانه Brotli است."
+                logger.error(f"Error fetching URL: {e}")
+                return None
         except Exception as e:
             logger.error(f"Error extracting HTML content: {e}", exc_info=True)
             return None
@@ -377,18 +390,18 @@ async def extract_html_content(url: str) -> Optional[str]:
 async def extract_json_content(url: str) -> Optional[str]:
     """Extract and format content from a JSON API response."""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=DEFAULT_HEADERS, timeout=15) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch JSON content: {response.status}")
-                    return None
+        session = await http_session.get_http_session()
+        async with session.get(url, headers=DEFAULT_HEADERS, timeout=15) as response:
+            if response.status != 200:
+                logger.error(f"Failed to fetch JSON content: {response.status}")
+                return None
                 
-                json_data = await response.json()
+            json_data = await response.json()
                 
-                # Format the JSON data as text
-                formatted_json = format_json_for_display(json_data)
+            # Format the JSON data as text
+            formatted_json = format_json_for_display(json_data)
                 
-                return f"داده‌های JSON از {url}:\n\n{formatted_json}"
+            return f"داده‌های JSON از {url}:\n\n{formatted_json}"
                 
     except Exception as e:
         logger.error(f"Error extracting JSON content: {e}", exc_info=True)
@@ -397,20 +410,20 @@ async def extract_json_content(url: str) -> Optional[str]:
 async def extract_generic_content(url: str) -> Optional[str]:
     """Extract content from a generic URL when the content type is unknown."""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=DEFAULT_HEADERS, timeout=15) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch generic content: {response.status}")
-                    return None
+        session = await http_session.get_http_session()
+        async with session.get(url, headers=DEFAULT_HEADERS, timeout=15) as response:
+            if response.status != 200:
+                logger.error(f"Failed to fetch generic content: {response.status}")
+                return None
                 
-                content_type = response.headers.get("Content-Type", "").lower()
+            content_type = response.headers.get("Content-Type", "").lower()
                 
-                if "text/plain" in content_type:
-                    text = await response.text()
-                    return f"محتوای متنی از {url}:\n\n{text[:5000]}..."
-                else:
-                    # For binary content, just return a description
-                    return f"این پیوند حاوی محتوای قابل استخراج نیست (نوع محتوا: {content_type})."
+            if "text/plain" in content_type:
+                text = await response.text()
+                return f"محتوای متنی از {url}:\n\n{text[:5000]}..."
+            else:
+                # For binary content, just return a description
+                return f"این پیوند حاوی محتوای قابل استخراج نیست (نوع محتوا: {content_type})."
                 
     except Exception as e:
         logger.error(f"Error extracting generic content: {e}", exc_info=True)
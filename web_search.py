@@ -12,6 +12,8 @@ import time
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
+import http_session
+
 # Load environment variables
 load_dotenv()
 
@@ -127,42 +129,42 @@ async def search_with_serper(query: str, is_news: bool = False, max_results: int
     if is_news:
         payload["type"] = "news"
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload, timeout=20) as response:
-            if response.status != 200:
-                logger.error(f"Serper API error: {response.status}")
-                raise Exception(f"Serper API error: {response.status}")
+    session = await http_session.get_http_session()
+    async with session.post(url, headers=headers, json=payload, timeout=20) as response:
+        if response.status != 200:
+            logger.error(f"Serper API error: {response.status}")
+            raise Exception(f"Serper API error: {response.status}")
             
-            data = await response.json()
+        data = await response.json()
             
-            # Format results
-            formatted_results = []
+        # Format results
+        formatted_results = []
             
-            # Process organic results
-            if "organic" in data:
-                for item in data["organic"][:max_results]:
-                    formatted_results.append({
-                        "title": item.get("title", ""),
-                        "snippet": item.get("snippet", ""),
-                        "link": item.get("link", "")
-                    })
+        # Process organic results
+        if "organic" in data:
+            for item in data["organic"][:max_results]:
+                formatted_results.append({
+                    "title": item.get("title", ""),
+                    "snippet": item.get("snippet", ""),
+                    "link": item.get("link", "")
+                })
             
-            # Process news results if searching for news
-            elif "news" in data:
-                for item in data["news"][:max_results]:
-                    formatted_results.append({
-                        "title": item.get("title", ""),
-                        "snippet": item.get("snippet", ""),
-                        "link": item.get("link", ""),
-                        "date": item.get("date", ""),
-                        "source": item.get("source", "")
-                    })
+        # Process news results if searching for news
+        elif "news" in data:
+            for item in data["news"][:max_results]:
+                formatted_results.append({
+                    "title": item.get("title", ""),
+                    "snippet": item.get("snippet", ""),
+                    "link": item.get("link", ""),
+                    "date": item.get("date", ""),
+                    "source": item.get("source", "")
+                })
             
-            return {
-                "query": query,
-                "results": formatted_results,
-                "message": format_search_message(query, formatted_results, is_news)
-            }
+        return {
+            "query": query,
+            "results": formatted_results,
+            "message": format_search_message(query, formatted_results, is_news)
+        }
 
 async def search_with_serpapi(query: str, is_news: bool = False, max_results: int = 5) -> Dict[str, Any]:
     """Search the web using SerpAPI"""
@@ -184,42 +186,42 @@ async def search_with_serpapi(query: str, is_news: bool = False, max_results: in
     
     url = "https://serpapi.com/search"
     
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params, timeout=20) as response:
-            if response.status != 200:
-                logger.error(f"SerpAPI error: {response.status}")
-                raise Exception(f"SerpAPI error: {response.status}")
+    session = await http_session.get_http_session()
+    async with session.get(url, params=params, timeout=20) as response:
+        if response.status != 200:
+            logger.error(f"SerpAPI error: {response.status}")
+            raise Exception(f"SerpAPI error: {response.status}")
             
-            data = await response.json()
+        data = await response.json()
             
-            # Format results
-            formatted_results = []
+        # Format results
+        formatted_results = []
             
-            # Process organic results
-            if "organic_results" in data:
-                for item in data["organic_results"][:max_results]:
-                    formatted_results.append({
-                        "title": item.get("title", ""),
-                        "snippet": item.get("snippet", ""),
-                        "link": item.get("link", "")
-                    })
+        # Process organic results
+        if "organic_results" in data:
+            for item in data["organic_results"][:max_results]:
+                formatted_results.append({
+                    "title": item.get("title", ""),
+                    "snippet": item.get("snippet", ""),
+                    "link": item.get("link", "")
+                })
             
-            # Process news results if searching for news
-            elif "news_results" in data:
-                for item in data["news_results"][:max_results]:
-                    formatted_results.append({
-                        "title": item.get("title", ""),
-                        "snippet": item.get("snippet", ""),
-                        "link": item.get("link", ""),
-                        "date": item.get("date", ""),
-                        "source": item.get("source", "")
-                    })
+        # Process news results if searching for news
+        elif "news_results" in data:
+            for item in data["news_results"][:max_results]:
+                formatted_results.append({
+                    "title": item.get("title", ""),
+                    "snippet": item.get("snippet", ""),
+                    "link": item.get("link", ""),
+                    "date": item.get("date", ""),
+                    "source": item.get("source", "")
+                })
             
-            return {
-                "query": query,
-                "results": formatted_results,
-                "message": format_search_message(query, formatted_results, is_news)
-            }
+        return {
+            "query": query,
+            "results": formatted_results,
+            "message": format_search_message(query, formatted_results, is_news)
+        }
 
 async def search_with_google_cse(query: str, is_news: bool = False, max_results: int = 5) -> Dict[str, Any]:
     """Search the web using Google Custom Search Engine"""
@@ -260,57 +262,57 @@ async def search_with_google_cse(query: str, is_news: bool = False, max_results:
     url = "https://www.googleapis.com/customsearch/v1"
     
     try:
-        async with aiohttp.ClientSession() as session:
-            logger.info(f"Sending Google CSE request to {url} with params: {params}")
-            async with session.get(url, params=params, timeout=20) as response:
-                response_text = await response.text()
+        session = await http_session.get_http_session()
+        logger.info(f"Sending Google CSE request to {url} with params: {params}")
+        async with session.get(url, params=params, timeout=20) as response:
+            response_text = await response.text()
                 
-                if response.status != 200:
-                    logger.error(f"Google CSE error: {response.status}. Response: {response_text[:200]}")
-                    raise Exception(f"Google CSE error: {response.status}")
+            if response.status != 200:
+                logger.error(f"Google CSE error: {response.status}. Response: {response_text[:200]}")
+                raise Exception(f"Google CSE error: {response.status}")
                 
-                try:
-                    data = json.loads(response_text)
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to parse Google CSE response: {response_text[:200]}")
-                    raise Exception("Invalid response format from Google CSE")
+            try:
+                data = json.loads(response_text)
+            except json.JSONDecodeError:
+                logger.error(f"Failed to parse Google CSE response: {response_text[:200]}")
+                raise Exception("Invalid response format from Google CSE")
                 
-                # Format results
-                formatted_results = []
+            # Format results
+            formatted_results = []
                 
-                if "items" in data:
-                    for item in data["items"][:max_results]:
-                        result = {
-                            "title": item.get("title", ""),
-                            "snippet": item.get("snippet", ""),
-                            "link": item.get("link", "")
-                        }
+            if "items" in data:
+                for item in data["items"][:max_results]:
+                    result = {
+                        "title": item.get("title", ""),
+                        "snippet": item.get("snippet", ""),
+                        "link": item.get("link", "")
+                    }
                         
-                        # Try to get date for news results
-                        if is_news and "pagemap" in item:
-                            if "newsarticle" in item["pagemap"]:
-                                news_article = item["pagemap"]["newsarticle"][0]
-                                if "datepublished" in news_article:
-                                    result["date"] = news_article["datepublished"]
-                                if "source" in news_article:
-                                    result["source"] = news_article["source"]
-                                elif "publisher" in news_article:
-                                    result["source"] = news_article["publisher"]
-                            # Also check for metatags which might have date info
-                            elif "metatags" in item["pagemap"]:
-                                metatags = item["pagemap"]["metatags"][0]
-                                if "og:article:published_time" in metatags:
-                                    result["date"] = metatags["og:article:published_time"]
-                                if "og:site_name" in metatags:
-                                    result["source"] = metatags["og:site_name"]
+                    # Try to get date for news results
+                    if is_news and "pagemap" in item:
+                        if "newsarticle" in item["pagemap"]:
+                            news_article = item["pagemap"]["newsarticle"][0]
+                            if "datepublished" in news_article:
+                                result["date"] = news_article["datepublished"]
+                            if "source" in news_article:
+                                result["source"] = news_article["source"]
+                            elif "publisher" in news_article:
+                                result["source"] = news_article["publisher"]
+                        # Also check for metatags which might have date info
+                        elif "metatags" in item["pagemap"]:
+                            metatags = item["pagemap"]["metatags"][0]
+                            if "og:article:published_time" in metatags:
+                                result["date"] = metatags["og:article:published_time"]
+                            if "og:site_name" in metatags:
+                                result["source"] = metatags["og:site_name"]
                         
-                        formatted_results.append(result)
+                    formatted_results.append(result)
                 
-                return {
-                    "query": query,
-                    "results": formatted_results,
-                    "message": format_search_message(query, formatted_results, is_news)
-                }
+            return {
+                "query": query,
+                "results": formatted_results,
+                "message": format_search_message(query, formatted_results, is_news)
+            }
     except aiohttp.ClientError as e:
         logger.error(f"Network error when calling Google CSE: {str(e)}")
         raise Exception(f"Network error: {str(e)}")